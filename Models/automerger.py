@@ -1,4 +1,5 @@
 from reo import *
+from graph import ConnectorGraph
 
 def define_connector(input_connectors):
     conn = Connector()
@@ -16,21 +17,25 @@ def define_connector(input_connectors):
         else:
             print(f"Error: Unknown channel type in {con}")
 
-    for i in range(len(mergers)):
-        src_num = len(mergers[i]) - 1
-        for j in range(src_num):
-            hidden_node = f"{mergers[i][j]}_{merger_count}"
+    # Every source of a merger is fed by a channel into the merger's sink; it is redirected to a hidden node
+    graph = ConnectorGraph(basic_channels)
+    redirected = set()
+    for merger in mergers:
+        sink = merger[-1]
+        for j in range(len(merger) - 1):
+            hidden_node = f"{merger[j]}_{merger_count}"
             merger_count += 1
-            
-            for k in range(len(basic_channels)):
-                if basic_channels[k][1][0] == mergers[i][j] and basic_channels[k][1][1] == mergers[i][-1]:
-                    basic_channels[k][1][1] = hidden_node
-                    mergers[i][j] = hidden_node
+
+            for k in graph.writers.get(sink, []):
+                if k not in redirected and basic_channels[k][1][0] == merger[j]:
+                    redirected.add(k)
+                    basic_channels[k][1][-1] = hidden_node
+                    merger[j] = hidden_node
                     break
             
     for con in basic_channels:
         conn.connect(con[0], *con[1])
     for con in mergers:
-        conn.connect('Merger', *con[1])
+        conn.connect('Merger', *con)
 
     return conn, basic_channels, mergers
\ No newline at end of file
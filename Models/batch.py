@@ -0,0 +1,79 @@
+import argparse
+import glob
+import json
+import os
+import shutil
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+from runner import DIRECTIONS, HEADER, print_experiment
+
+
+def read_header(path):
+    # The description emit_check wrote on the first line of a query file, or None
+    with open(path) as f:
+        line = f.readline()
+    if not line.startswith(HEADER):
+        return None
+    return json.loads(line[len(HEADER):])
+
+
+def solve_file(path, z3='z3', timeout=None):
+    """
+    Solve one query file with the z3 binary and return the outcome in the format of runner.run_check
+    """
+    header = read_header(path)
+    try:
+        completed = subprocess.run([z3, '-smt2', path], capture_output=True, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return {'status': 'unknown', 'reason': f"timeout after {timeout}s", 'configuration': header['configuration']}
+
+    lines = completed.stdout.strip().splitlines()
+    result = lines[0].strip() if lines else ''
+    if result == 'unsat':
+        return {'status': 'true', 'bound': header['bound'], 'counterexample': None,
+                'configuration': header['configuration']}
+    if result == 'sat':
+        return {'status': 'false', 'bound': header['bound'], 'counterexample': "\n".join(lines[1:]) or None,
+                'configuration': header['configuration']}
+    reason = result or completed.stderr.strip() or f"z3 exited with code {completed.returncode}"
+    return {'status': 'unknown', 'reason': reason, 'configuration': header['configuration']}
+
+
+def solve_directory(directory, jobs, z3='z3', timeout=None):
+    """
+    Solve every query file emit_check wrote to `directory` with `jobs` z3 processes at a time.
+    Returns {case name: {direction: outcome}}.
+    """
+    files = [path for path in sorted(glob.glob(os.path.join(directory, '*.smt2'))) if read_header(path) is not None]
+    results = {}
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        outcomes = pool.map(lambda path: solve_file(path, z3, timeout), files)
+        for path, outcome in zip(files, outcomes):
+            header = read_header(path)
+            results.setdefault(header['case'], {})[(header['source'], header['target'])] = outcome
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Solve the queries written by main.py --emit-smt2 with the z3 binary")
+    parser.add_argument("directory", help="Directory of the query files")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(), help="Number of z3 processes at a time (default: all cores)")
+    parser.add_argument("--timeout", type=float, help="Wall-clock limit in seconds per query; overdue queries are reported as unknown")
+    parser.add_argument("--z3", default=shutil.which('z3') or 'z3', help="Path of the z3 binary")
+    args = parser.parse_args()
+
+    try:
+        results = solve_directory(args.directory, args.jobs, args.z3, args.timeout)
+    except OSError as e:
+        # Missing, not executable or not a binary: every query would fail the same way
+        if e.filename != args.z3:
+            raise
+        parser.error(f"cannot run the z3 binary '{args.z3}' ({e.strerror}); give its path with --z3")
+    for name in sorted(results.keys()):
+        missing = {'status': 'unknown', 'reason': "no query file"}
+        print_experiment(name, {direction: results[name].get(direction, missing) for direction in DIRECTIONS})
+
+
+if __name__ == "__main__":
+    main()
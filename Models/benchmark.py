@@ -0,0 +1,223 @@
+import argparse
+import csv
+import json
+import statistics
+import sys
+import time
+
+from z3 import get_version_string
+
+from reo import Connector, Channel, getSettings, applySettings
+from channel import channelTemplate
+from graph import satisfiable
+
+DEFAULT_SIZES = [2, 3, 4]
+DEFAULT_BOUNDS = [3, 5]
+DEFAULT_THRESHOLD = 0.25 # relative slowdown reported as a regression
+MIN_TIME = 0.01 # seconds; slowdowns of faster measurements are noise
+
+FIELDS = ['family', 'size', 'bound', 'channels', 'result', 'encode_time', 'solve_time']
+
+
+def build(channels):
+    connector = Connector()
+    for chan, nodes in channels:
+        connector.connect(chan, *nodes)
+    return connector
+
+
+# Generators: size n -> (implementation, specification), with implementation <= specification.
+# The connectors are built directly rather than through automerger, so Merger nodes are given explicitly.
+
+def fifo_chain(n):
+    """
+    n Fifo1 channels in a row from A to B, against the same chain with differently named internal nodes
+    """
+    def chain(prefix):
+        names = ['A'] + [f"{prefix}{i}" for i in range(1, n)] + ['B']
+        return build([('Fifo1', (names[i], names[i + 1])) for i in range(n)])
+    return chain('X'), chain('Y')
+
+
+def merger_fanin(n):
+    """
+    n sources S_i merged into T through Syncs, against the same merger fed through LossySyncs
+    """
+    def fanin(channel, prefix):
+        hidden = [f"{prefix}{i}" for i in range(n)]
+        channels = [(channel, (f"S{i}", hidden[i])) for i in range(n)]
+        return build(channels + [('Merger', tuple(hidden) + ('T',))])
+    return fanin('Sync', 'H'), fanin('LossySync', 'G')
+
+
+def lossy_ladder(n):
+    """
+    Two rails of n Syncs from A0/B0 to An/Bn with a SyncDrain rung after every step, against the same ladder
+    with LossySync rails
+    """
+    def ladder(channel, prefix):
+        def name(rail, i):
+            return f"{rail}{i}" if i in (0, n) else f"{prefix}{rail}{i}"
+        channels = []
+        for i in range(n):
+            channels += [(channel, (name('A', i), name('A', i + 1))), (channel, (name('B', i), name('B', i + 1))),
+                         ('SyncDrain', (name('A', i + 1), name('B', i + 1)))]
+        return build(channels)
+    return ladder('Sync', 'X'), ladder('LossySync', 'Y')
+
+
+def timer_pipeline(n):
+    """
+    n Timert(1) channels in a row from A to B, against the same pipeline with differently named internal nodes
+    """
+    def pipeline(prefix):
+        names = ['A'] + [f"{prefix}{i}" for i in range(1, n)] + ['B']
+        return build([('Timert(1)', (names[i], names[i + 1])) for i in range(n)])
+    return pipeline('X'), pipeline('Y')
+
+
+FAMILIES = {
+    'fifo_chain': fifo_chain,
+    'merger_fanin': merger_fanin,
+    'lossy_ladder': lossy_ladder,
+    'timer_pipeline': timer_pipeline
+    }
+
+
+def measure(family, size, bound, timeout=None):
+    """
+    Encode and solve implementation <= specification of one benchmark instance, timing both separately.
+    Channel templates are cleared first, so every measurement includes the encoding of its channels.
+    Raises ValueError if either connector has no behavior at `bound`, since the check would hold vacuously.
+    """
+    impl, spec = FAMILIES[family](size)
+    for side, connector in [('implementation', impl), ('specification', spec)]:
+        if not satisfiable(connector, bound):
+            raise ValueError(f"the {side} of {family} size {size} has no behavior at bound {bound}")
+    channelTemplate.cache_clear()
+
+    start = time.perf_counter()
+    solver = impl.refinementSolver(spec, bound)
+    encoded = time.perf_counter()
+    if timeout is not None:
+        solver.set('timeout', int(timeout * 1000))
+    result = str(solver.check())
+    solved = time.perf_counter()
+
+    return {
+        'family': family,
+        'size': size,
+        'bound': bound,
+        'channels': len(impl.channels) + len(spec.channels),
+        'result': {'sat': 'false', 'unsat': 'true'}.get(result, 'unknown'),
+        'encode_time': encoded - start,
+        'solve_time': solved - encoded
+        }
+
+
+def run_benchmarks(families, sizes, bounds, repeat=1, timeout=None):
+    """
+    Sweep every family over sizes x bounds; the times reported are the medians of `repeat` runs
+    """
+    results = []
+    for family in families:
+        for size in sizes:
+            for bound in bounds:
+                runs = [measure(family, size, bound, timeout) for _ in range(repeat)]
+                row = dict(runs[0])
+                for field in ['encode_time', 'solve_time']:
+                    row[field] = statistics.median(run[field] for run in runs)
+                print(f"{family:15} size {size:3} bound {bound:3}: encode {row['encode_time']:8.3f}s  "
+                      f"solve {row['solve_time']:8.3f}s  [{row['result']}]")
+                results += [row]
+    return results
+
+
+def write_results(results, json_path=None, csv_path=None):
+    if json_path is not None:
+        with open(json_path, 'w') as f:
+            json.dump({'z3': get_version_string(), 'settings': getSettings(), 'results': results}, f, indent=2)
+    if csv_path is not None:
+        with open(csv_path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=FIELDS)
+            writer.writeheader()
+            writer.writerows(results)
+
+
+def compare(baseline, current, threshold=DEFAULT_THRESHOLD):
+    """
+    Compare two result lists (as written by write_results) instance by instance.
+    Returns the regressions: changed verdicts and times more than `threshold` slower than the baseline.
+    """
+    def key(row):
+        return row['family'], row['size'], row['bound']
+
+    previous = {key(row): row for row in baseline}
+    regressions = []
+    for row in current:
+        old = previous.get(key(row))
+        if old is None:
+            continue
+        if row['result'] != old['result']:
+            regressions += [(key(row), 'result', old['result'], row['result'])]
+        for field in ['encode_time', 'solve_time']:
+            if row[field] > MIN_TIME and row[field] > old[field] * (1 + threshold):
+                regressions += [(key(row), field, old[field], row[field])]
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scalability benchmarks of the refinement encoding")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="Sweep the generators over sizes and bounds")
+    run.add_argument("--families", default=",".join(FAMILIES), help="Comma-separated generators (default: all)")
+    run.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)), help="Comma-separated connector sizes")
+    run.add_argument("--bounds", default=",".join(map(str, DEFAULT_BOUNDS)), help="Comma-separated bounds")
+    run.add_argument("--repeat", type=int, default=1, help="Runs per instance; the median time is reported")
+    run.add_argument("--timeout", type=float, help="Solver timeout in seconds per instance")
+    run.add_argument("--merger", choices=["counter", "interleaving"], default=Channel.MERGER_ENCODING, help="Merger encoding")
+    run.add_argument("--time", choices=["real", "int"], default=Channel.TIME_DOMAIN, help="Time domain")
+    run.add_argument("--logic", default=Connector.LOGIC, help="Logic of the solvers (see main.py --logic)")
+    run.add_argument("--json", help="Write the results to this JSON file")
+    run.add_argument("--csv", help="Write the results to this CSV file")
+
+    comp = commands.add_parser("compare", help="Report regressions of a result file against a baseline")
+    comp.add_argument("baseline", help="JSON results of the baseline")
+    comp.add_argument("current", help="JSON results to check")
+    comp.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                      help=f"Relative slowdown reported as a regression (default: {DEFAULT_THRESHOLD})")
+
+    args = parser.parse_args()
+
+    if args.command == "run":
+        families = args.families.split(",")
+        for family in families:
+            if family not in FAMILIES:
+                parser.error(f"unknown family '{family}' (available: {', '.join(FAMILIES)})")
+        applySettings(dict(getSettings(), merger=args.merger, time=args.time, logic=args.logic))
+        results = run_benchmarks(families, [int(s) for s in args.sizes.split(",")],
+                                 [int(b) for b in args.bounds.split(",")], args.repeat, args.timeout)
+        write_results(results, args.json, args.csv)
+        return
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    if baseline['settings'] != current['settings']:
+        print(f"Warning: settings differ ({baseline['settings']} vs {current['settings']})")
+
+    regressions = compare(baseline['results'], current['results'], args.threshold)
+    for (family, size, bound), field, old, new in regressions:
+        if field == 'result':
+            print(f"\033[91m[REGRESSION]\033[0m {family} size {size} bound {bound}: verdict {old} -> {new}")
+        else:
+            print(f"\033[91m[REGRESSION]\033[0m {family} size {size} bound {bound}: {field} {old:.3f}s -> {new:.3f}s")
+    if regressions:
+        sys.exit(1)
+    print("\033[92mNo regressions\033[0m")
+
+
+if __name__ == "__main__":
+    main()
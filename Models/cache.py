@@ -0,0 +1,110 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+from z3 import get_version_string
+
+from reo import Channel, Connector, getSettings
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.refinement_cache.sqlite')
+DEFAULT_SIZE = 64 # MB
+
+
+def encoding_version():
+    """
+    Hash of the modules of the package, so that editing anything that can change a verdict (the encoding, the
+    rewrites, the engines) invalidates the cached verdicts
+    """
+    digest = hashlib.sha256()
+    here = os.path.dirname(os.path.abspath(__file__))
+    for module in sorted(name for name in os.listdir(here) if name.endswith('.py')):
+        digest.update(module.encode())
+        with open(os.path.join(here, module), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def canonical_channels(connector, boundary, prefix):
+    """
+    The channel list of a connector with every node outside `boundary` renamed by order of first appearance,
+    so connectors that only differ in the names of their internal (or hidden) nodes get the same form
+    """
+    names = {}
+    channels = []
+    for chan, nodes in connector.channels:
+        renamed = []
+        for nd in nodes:
+            if nd not in boundary and nd not in names:
+                names[nd] = f"{prefix}#{len(names)}"
+            renamed += [names.get(nd, nd)]
+        channels += [[chan, renamed]]
+    return channels
+
+
+class ResultCache:
+    """
+    On-disk cache of refinement verdicts (SQLite), evicting the least recently used entries
+    once the stored counter-examples exceed `max_size` MB.
+    Every process opens its own connection, so the cache can be shared by the --jobs workers.
+    """
+    def __init__(self, path=DEFAULT_PATH, max_size=DEFAULT_SIZE):
+        self.path = path
+        self.max_size = max_size
+        self.version = get_version_string() + '/' + encoding_version()
+        self.db = None
+
+    def connect(self):
+        if self.db is None:
+            self.db = sqlite3.connect(self.path, timeout=60)
+            self.db.execute('CREATE TABLE IF NOT EXISTS results ('
+                            'key TEXT PRIMARY KEY, outcome TEXT NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)')
+        return self.db
+
+    def key(self, source_conn, target_conn, bound, max_bound=None):
+        """
+        Key of the check source <= target, or None if it cannot be cached
+        """
+        # Verdicts of randomized channels are samples, unless they are exact probabilities
+        if not Connector.EXACT and any(chan.split('(')[0] in Channel.RANDOMIZED for conn in [source_conn, target_conn] for chan, _ in conn.channels):
+            return None
+
+        # Nodes shared by both connectors are observable; all others are internal
+        boundary = {nd for _, nodes in source_conn.channels for nd in nodes} & \
+                   {nd for _, nodes in target_conn.channels for nd in nodes}
+        # A sweep up to max_bound does not depend on the single-check bound
+        material = {
+            'source': canonical_channels(source_conn, boundary, 's'),
+            'target': canonical_channels(target_conn, boundary, 't'),
+            'bound': bound if max_bound is None else None,
+            'max_bound': max_bound,
+            'settings': getSettings(),
+            'version': self.version
+            }
+        return hashlib.sha256(json.dumps(material, sort_keys=True).encode()).hexdigest()
+
+    def get(self, key):
+        db = self.connect()
+        row = db.execute('SELECT outcome FROM results WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        with db:
+            db.execute('UPDATE results SET last_used = ? WHERE key = ?', (time.time(), key))
+        return json.loads(row[0])
+
+    def put(self, key, outcome):
+        db = self.connect()
+        data = json.dumps(outcome)
+        with db:
+            db.execute('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)', (key, data, len(data), time.time()))
+            self.evict(db)
+
+    def evict(self, db):
+        total = db.execute('SELECT COALESCE(SUM(size), 0) FROM results').fetchone()[0]
+        limit = self.max_size * 1024 * 1024
+        for key, size in db.execute('SELECT key, size FROM results ORDER BY last_used').fetchall():
+            if total <= limit:
+                break
+            db.execute('DELETE FROM results WHERE key = ?', (key,))
+            total -= size
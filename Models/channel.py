@@ -1,27 +1,69 @@
 from z3 import *
 from random import *
+from functools import lru_cache
+from fractions import Fraction
+from math import lcm
+import re
+
+# Number of (channel, bound) encodings kept by channelTemplate
+TEMPLATE_CACHE_SIZE = 256
+
+# Hash-cons table of the terms built by Conjunction/Disjunction: (operator, ids of the arguments) -> term.
+# It is cleared once it holds HASHCONS_SIZE terms.
+HASHCONS_SIZE = 1 << 16
+hashcons = {}
+
+def Connective(op, constraints):
+    """
+    Flat n-ary `op` (And / Or) of a list of constraints. Units (True for And, False for Or) and repeated
+    arguments are dropped, a zero (False for And, True for Or) absorbs the whole term, and identical terms
+    are shared through the hash-cons table.
+    Arguments that are themselves And / Or terms are kept as they are, so that memoized sub-formulas
+    (e.g. the states of LossySync or Merger) stay shared instead of being copied into every parent.
+    """
+    isUnit, isZero = (is_true, is_false) if op is And else (is_false, is_true)
+    args = []
+    seen = set()
+    for c in constraints:
+        if isinstance(c, bool):
+            c = BoolVal(c)
+        if isZero(c):
+            return c
+        if isUnit(c) or c.get_id() in seen:
+            continue
+        seen.add(c.get_id())
+        args.append(c)
+
+    if len(args) == 0:
+        return BoolVal(op is And)
+    if len(args) == 1:
+        return args[0]
+
+    key = (op.__name__, tuple(c.get_id() for c in args))
+    if key not in hashcons:
+        if len(hashcons) >= HASHCONS_SIZE:
+            hashcons.clear()
+        hashcons[key] = op(args)
+    return hashcons[key]
 
 def Conjunction(constraints):
     assert len(constraints) > 0
-
-    result = None
-    for c in constraints:
-        if result is None:
-            result = c
-        else:
-            result = And(result, c)
-
-    return result
+    return Connective(And, constraints)
 
 def Disjunction(constraints):
     assert len(constraints) > 0
-
-    result = None
-    for c in constraints:
-        if result is None:
-            result = c
+    return Connective(Or, constraints)
+
+def Conjuncts(constraint):
+    # Flatten nested And terms (e.g. built by Conjunction) into the list of their conjuncts
+    result = []
+    stack = [constraint]
+    while stack:
+        c = stack.pop()
+        if is_and(c):
+            stack += reversed(c.children())
         else:
-            result = Or(result, c)
+            result.append(c)
     return result
 
 
@@ -33,6 +75,32 @@ class Channel:
     RESET = 13
     EXPIRE = 14
 
+    # Channels whose constraints for bound k are a subset of their constraints for bound k + 1
+    PREFIX_CLOSED = {'Sync', 'Fifo1', 'Fifo1e', 'SyncDrain', 'Producerp', 'SyncSpout', 'Timert'}
+
+    # Channels that draw random numbers while being encoded, so every instance gets its own encoding
+    RANDOMIZED = {'CptSync', 'RdmSync', 'ProbLossy', 'FtyFIFO1', 'LossyFIFO1'}
+
+    # Domain of the node data: 'int' (unbounded integers) or 'bv' (signed bit-vectors just wide enough for
+    # the check, see useDataDomain). DATA_SORT is the sort of the data variables of the current check.
+    DATA_DOMAIN = 'int'
+    DATA_SORT = IntSort()
+
+    # Domain of the time stamps: 'real' or 'int' (integers counting 1 / TIME_SCALE time units, see useTimeDomain).
+    # TIME_SORT is the sort of the time variables of the current check; only the refining connector's nodes get it,
+    # the nodes only the abstraction uses stay real.
+    TIME_DOMAIN = 'real'
+    TIME_SORT = RealSort()
+    TIME_SCALE = 1
+
+    # How the probabilistic channels draw: 'sample' (Python's random, while encoding) or 'symbolic' (a Boolean
+    # choice variable per draw; CHOICES collects (variable, probability of being true) of the encodings since reset)
+    PROBABILITY = 'sample'
+    CHOICES = []
+
+    # Timers, whose parameter is a delay
+    TIMERS = {'Timert', 'OFFTimert', 'RSTTimert', 'EXPTimert'}
+
 
     # basic channels in [9]
     @staticmethod
@@ -124,42 +192,57 @@ class Channel:
         return Conjunction(constraints)
     
     @staticmethod
-    def LossySync(nodes, bound, idx = 0, num = 0):
+    def LossySync(nodes, bound):
         assert len(nodes) == 2
-        if bound == num:
-            return True
-        if bound == idx:
-            return True
-        constraints_0 = []
-        constraints_1 = []
-        # constraints_0: The idx-th data at the source end is lost (time mismatch, source end advancing the index).
-        constraints_0 += [ nodes[0]['time'][idx] != nodes[1]['time'][num]]
-        # Constraint 2: The idx-th data from the source has been successfully transmitted (data and time match,
-        # both sides advance the index)
-        constraints_1 += [ nodes[0]['data'][idx] == nodes[1]['data'][num]]
-        constraints_1 += [ nodes[0]['time'][idx] == nodes[1]['time'][num]]
-        # Disjunction of two cases (logical OR): either data loss or successful transmission.
-        return Or(And(Conjunction(constraints_0), Channel.LossySync(nodes, bound, idx + 1, num)),
-                  And(Conjunction(constraints_1), Channel.LossySync(nodes, bound, idx + 1, num + 1)))
+        # Memoize on (idx, num): every state is built once and shared, so the term is a DAG of size O(bound^2)
+        memo = {}
+
+        def LossySyncInstance(idx, num):
+            if bound == num or bound == idx:
+                return True
+            if (idx, num) in memo:
+                return memo[(idx, num)]
+            constraints_0 = []
+            constraints_1 = []
+            # constraints_0: The idx-th data at the source end is lost (time mismatch, source end advancing the index).
+            constraints_0 += [ nodes[0]['time'][idx] != nodes[1]['time'][num]]
+            # Constraint 2: The idx-th data from the source has been successfully transmitted (data and time match,
+            # both sides advance the index)
+            constraints_1 += [ nodes[0]['data'][idx] == nodes[1]['data'][num]]
+            constraints_1 += [ nodes[0]['time'][idx] == nodes[1]['time'][num]]
+            # Disjunction of two cases (logical OR): either data loss or successful transmission.
+            memo[(idx, num)] = Or(And(Conjunction(constraints_0), LossySyncInstance(idx + 1, num)),
+                                  And(Conjunction(constraints_1), LossySyncInstance(idx + 1, num + 1)))
+            return memo[(idx, num)]
+
+        return LossySyncInstance(0, 0)
 
     # additional channels in [10]
     @staticmethod
     def Filterp(p):
         # is p a list or a function? I use list here
-        def FilterpInstance(nodes, bound, i = 0, j = 0):
+        def FilterpInstance(nodes, bound):
             assert len(nodes) == 2
-            if i == bound:
-                return True
-            constraints = []
-            if nodes[0]['data'][i] in p:
+            memo = {}
+
+            def Filter(i, j):
+                if i == bound or j == bound:
+                    return True
+                if (i, j) in memo:
+                    return memo[(i, j)]
+                # The membership test has to be symbolic: data accepted by the filter is passed on to the sink
+                accepted = Disjunction([nodes[0]['data'][i] == v for v in p])
+                constraints = []
                 constraints += [nodes[0]['data'][i] == nodes[1]['data'][j]]
                 constraints += [nodes[0]['time'][i] == nodes[1]['time'][j]]
-                return And(Conjunction(constraints), FilterpInstance(nodes, bound, i + 1, j + 1))
-            else:
-                return FilterpInstance(nodes, bound, i + 1, j)
-        
+                memo[(i, j)] = Or(And(accepted, Conjunction(constraints), Filter(i + 1, j + 1)),
+                                  And(Not(accepted), Filter(i + 1, j)))
+                return memo[(i, j)]
+
+            return Filter(0, 0)
+
         return FilterpInstance
-    
+
     @staticmethod
     def Producerp(p): # p is a list
         def ProducerpInstance(nodes, bound):
@@ -218,6 +301,7 @@ class Channel:
         return Conjunction(constraints)
 
     # Probabilistic
+    # Every random draw is a Choice: resolved while encoding ('sample' mode) or a choice variable ('symbolic' mode)
     @staticmethod
     def CptSync(p):
         def CptSyncInstance(nodes, bound):
@@ -226,13 +310,10 @@ class Channel:
             constraints = []
     
             for i in range(bound):
-                q = uniform(0, 1)
+                corrupted = Choice(p)
                 constraints += [nodes[0]['time'][i] == nodes[1]['time'][i]]
-    
-                if q > p:
-                    constraints.append(nodes[1]['data'][i] == nodes[0]['data'][i])
-                else:
-                    constraints.append(nodes[1]['data'][i] == Channel.CORRUPTED)
+                constraints += [Choose(corrupted, nodes[1]['data'][i] == Channel.CORRUPTED,
+                                       nodes[1]['data'][i] == nodes[0]['data'][i])]
     
             return Conjunction(constraints)
         return CptSyncInstance
@@ -243,55 +324,55 @@ class Channel:
         constraints = []
 
         for i in range(bound):
-            p = randint(0, 1)
+            one = Choice(0.5)
             constraints += [nodes[0]['time'][i] == nodes[1]['time'][i]]
-
-            if p > 0.5:
-                constraints.append(nodes[1]['data'][i] == 1)
-            else:
-                constraints.append(nodes[1]['data'][i] == 0)
+            constraints += [Choose(one, nodes[1]['data'][i] == 1, nodes[1]['data'][i] == 0)]
 
         return Conjunction(constraints)
 
     @staticmethod
     def ProbLossy(p):
-        def ProbLossyInstance(nodes, bound, idx=0, num=0):
+        def ProbLossyInstance(nodes, bound):
             assert len(nodes) == 2
             assert 0 <= p <= 1
-    
-            q = uniform(0, 1)
-            if bound == num or bound == idx:
-                return True
-    
-            constraints_0 = []
-            constraints_1 = []
-    
-            constraints_0 += [nodes[0]['time'][idx] != nodes[1]['time'][num]]
-    
-            constraints_1 += [nodes[0]['data'][idx] == nodes[1]['data'][num]]
-            constraints_1 += [nodes[0]['time'][idx] == nodes[1]['time'][num]]
-    
-            time_mismatch = And(
-                Conjunction(constraints_0),
-                ProbLossyInstance(nodes, bound, idx + 1, num)
-            )
-    
-            loss_prob = And(
-                Conjunction([nodes[0]['time'][idx] == nodes[1]['time'][num]]),
-                ProbLossyInstance(nodes, bound, idx + 1, num)
-            )
-    
-            success = And(
-                Conjunction(constraints_1),
-                ProbLossyInstance(nodes, bound, idx + 1, num + 1)
-            )
-    
-            branch_time_match = Or(
-                And(q <= p, loss_prob),
-                And(q > p, success)
-            )
-    
-            return Or(time_mismatch, branch_time_match)
+            # Same (idx, num) sharing as LossySync; one draw per state
+            memo = {}
+
+            def ProbLossyState(idx, num):
+                if bound == num or bound == idx:
+                    return True
+                if (idx, num) in memo:
+                    return memo[(idx, num)]
+
+                lost = Choice(p)
+
+                constraints_0 = []
+                constraints_1 = []
+
+                constraints_0 += [nodes[0]['time'][idx] != nodes[1]['time'][num]]
+
+                constraints_1 += [nodes[0]['data'][idx] == nodes[1]['data'][num]]
+                constraints_1 += [nodes[0]['time'][idx] == nodes[1]['time'][num]]
+
+                time_mismatch = And(
+                    Conjunction(constraints_0),
+                    ProbLossyState(idx + 1, num)
+                )
+
+                loss_prob = And(
+                    Conjunction([nodes[0]['time'][idx] == nodes[1]['time'][num]]),
+                    ProbLossyState(idx + 1, num)
+                )
+
+                success = And(
+                    Conjunction(constraints_1),
+                    ProbLossyState(idx + 1, num + 1)
+                )
+
+                memo[(idx, num)] = Or(time_mismatch, Choose(lost, loss_prob, success))
+                return memo[(idx, num)]
+
+            return ProbLossyState(0, 0)
         return ProbLossyInstance
 
     @staticmethod
@@ -299,22 +380,17 @@ class Channel:
         def FtyFIFO1Instance(nodes, bound):
             assert len(nodes) == 2
             assert 0 <= p <= 1
-    
-            r = 0
+
+            # An item is faulty with probability p: its data is not passed on, and the buffer counts as empty
+            # afterwards, so the next item does not have to wait for the previous reception
+            faulty = None
             constraints = []
             for i in range(bound):
-                q = uniform(0, 1)
                 constraints += [nodes[0]['time'][i] < nodes[1]['time'][i]]
-                if r == 0:
-                    if q > p:
-                        r = 1
-                        constraints += [nodes[0]['data'][i] == nodes[1]['data'][i]]
-                else:
-                    constraints += [nodes[0]['time'][i] > nodes[1]['time'][i - 1]]
-                    if q <= p:
-                        r = 0
-                    else:
-                        constraints += [nodes[0]['data'][i] == nodes[1]['data'][i]]
+                if faulty is not None:
+                    constraints += [Choose(faulty, True, nodes[0]['time'][i] > nodes[1]['time'][i - 1])]
+                faulty = Choice(p)
+                constraints += [Choose(faulty, True, nodes[0]['data'][i] == nodes[1]['data'][i])]
     
             return Conjunction(constraints)
         return FtyFIFO1Instance
@@ -327,10 +403,9 @@ class Channel:
 
             constraints = []
             for i in range(bound):
-                q = uniform(0, 1)
+                lost = Choice(p)
                 constraints += [ nodes[0]['time'][i] <  nodes[1]['time'][i] ]
-                if q > p:
-                    constraints += [ nodes[0]['data'][i] == nodes[1]['data'][i] ]
+                constraints += [ Choose(lost, True, nodes[0]['data'][i] == nodes[1]['data'][i]) ]
                 if i != 0:
                     constraints += [ nodes[0]['time'][i] > nodes[1]['time'][i-1] ]
 
@@ -342,92 +417,95 @@ class Channel:
     def Timert(t):
         def TimertInstance(nodes, bound):
             assert len(nodes) == 2
+            delay = timeConstant(t)
             constraints = []
             for i in range(bound):
                 constraints += [nodes[1]['data'][i] == Channel.TIMEOUT]
-                constraints += [nodes[0]['time'][i] + t == nodes[1]['time'][i]]
+                constraints += [nodes[0]['time'][i] + delay == nodes[1]['time'][i]]
                 if i < bound - 1:
-                    constraints += [nodes[0]['time'][i + 1] >= nodes[1]['time'][i] + t]
+                    constraints += [nodes[0]['time'][i + 1] >= nodes[1]['time'][i] + delay]
             return Conjunction(constraints)
         return TimertInstance
     
     @staticmethod
     def OFFTimert(t):
-        def OFFTimertInstance(nodes, bound, i = 0, j = 0):
-            assert len(nodes) == 2
-            if i >= bound:
-                return True
-            if j >= bound:
-                return True
-            constraints_0, constraints_1 = [], []
+        return Channel.ResettableTimer(t, Channel.OFF)
 
-            constraints_0 += [nodes[0]['data'][i + 1] == Channel.OFF]
-            constraints_0 += [nodes[0]['time'][i] + t > nodes[1]['time'][i + 1]]
-            # 需要加 i < bound - 1吗？不加的话，如果i == bound - 1自动不满足data[i + 1] == Channel.OFF
+    @staticmethod
+    def RSTTimert(t):
+        return Channel.ResettableTimer(t, Channel.RESET)
 
-            constraints_1 += [nodes[1]['data'][j] == Channel.TIMEOUT]
-            constraints_1 += [nodes[1]['time'][j] == nodes[0]['time'][i] + t]
-            constraints_1 += [Or(nodes[0]['time'][i] + t <= nodes[1]['time'][i + 1], i == bound - 1)]
+    @staticmethod
+    def EXPTimert(t):
+        return Channel.ResettableTimer(t, Channel.EXPIRE)
 
-            return Or(
-                And(Conjunction(constraints_0), OFFTimertInstance(nodes, bound, i + 2, j)),
-                And(Conjunction(constraints_1), OFFTimertInstance(nodes, bound, i + 1, j + 1))
-            )
-        return OFFTimertInstance
-        
     @staticmethod
-    def RSTTimert(t):
-        def RSTTimertInstance(nodes, bound, i = 0, j = 0):
+    def ResettableTimer(t, signal):
+        # Shared state machine of OFFTimert/RSTTimert/EXPTimert. Every source item either arms the timer or is a
+        # signal that was consumed by the previous one. An armed timer is interrupted when the next item is
+        # `signal` and arrives before the timeout, otherwise it emits TIMEOUT at time + t:
+        #   OFF:    the timer is switched off and the OFF item does not arm it again
+        #   RESET:  the RESET item re-arms the timer
+        #   EXPIRE: the timer emits TIMEOUT right away and the EXPIRE item re-arms it
+        def ResettableTimerInstance(nodes, bound):
             assert len(nodes) == 2
-            if i >= bound:
-                return True
-            if j >= bound:
-                return True
-            constraints_0, constraints_1 = [], []
+            src, snk = nodes
+            delay = timeConstant(t)
+            constraints = []
 
-            constraints_0 += [nodes[0]['data'][i + 1] == Channel.RESET]
-            constraints_0 += [nodes[0]['time'][i] + t > nodes[1]['time'][i + 1]]
+            def Emit(pos, time):
+                # The timeout goes to the sink slot the counter currently points at
+                return Conjunction([Implies(pos[v], And(snk['data'][v] == Channel.TIMEOUT, snk['time'][v] == time))
+                                    for v in range(len(pos))])
 
-            constraints_1 += [nodes[1]['data'][j] == Channel.TIMEOUT]
-            constraints_1 += [nodes[1]['time'][j] == nodes[0]['time'][i] + t]
-            constraints_1 += [Or(nodes[0]['time'][i] + t <= nodes[1]['time'][i + 1], i == bound - 1)]
+            armed = BoolVal(True)  # mode of item i: arms the timer, or was consumed as a signal
+            pos = [BoolVal(True)]  # pos[v]: v timeouts have been emitted before item i (unary counter)
+            for i in range(bound):
+                expire = src['time'][i] + delay
+                if i == bound - 1:
+                    # Nothing after the last item: the timer runs out
+                    constraints += [Implies(armed, Emit(pos, expire))]
+                    break
+
+                interrupted = And(src['data'][i + 1] == signal, src['time'][i + 1] < expire)
+                timeout = And(Emit(pos, expire), expire <= src['time'][i + 1])
+                if signal == Channel.EXPIRE:
+                    constraints += [Implies(armed, Or(And(interrupted, Emit(pos, src['time'][i + 1])), timeout))]
+                    emitted = armed
+                else:
+                    constraints += [Implies(armed, Or(interrupted, timeout))]
+                    emitted = And(armed, Not(interrupted))
+
+                pos = [And(pos[0], Not(emitted))] + \
+                      [Or(And(pos[v], Not(emitted)), And(pos[v - 1], emitted)) for v in range(1, i + 1)] + \
+                      [And(pos[i], emitted)]
+                if signal == Channel.OFF:
+                    armed = Not(And(armed, interrupted))
+
+            return Conjunction(constraints)
+        return ResettableTimerInstance
 
-            return Or(
-                And(Conjunction(constraints_0), RSTTimertInstance(nodes, bound, i + 1, j)),
-                And(Conjunction(constraints_1), RSTTimertInstance(nodes, bound, i + 1, j + 1))
-            )
-        return RSTTimertInstance
-    
-    @staticmethod
-    def EXPTimert(t):
-        def EXPTimertInstance(nodes, bound, i = 0):
-            assert len(nodes) == 2
-            if i >= bound:
-                return True
-            constraints_0, constraints_1 = [], []
-
-            constraints_0 += [nodes[0]['data'][i + 1] == Channel.EXPIRE]
-            constraints_0 += [nodes[1]['data'][i] == Channel.TIMEOUT]
-            constraints_0 += [nodes[0]['time'][i] + t > nodes[1]['time'][i + 1]]
-            constraints_0 += [nodes[1]['time'][i] == nodes[0]['time'][i + 1]]
-
-            constraints_1 += [nodes[1]['data'][i] == Channel.TIMEOUT]
-            constraints_1 += [nodes[1]['time'][i] == nodes[0]['time'][i] + t]
-            constraints_1 += [Or(nodes[0]['time'][i] + t <= nodes[1]['time'][i + 1], i == bound - 1)]
-
-            return Or(
-                And(Conjunction(constraints_0), EXPTimertInstance(nodes, bound, i + 1)),
-                And(Conjunction(constraints_1), EXPTimertInstance(nodes, bound, i + 1))
-            )
-        return EXPTimertInstance
-    
     # Merge
+    # Encoding used by Merger: 'interleaving' (memoized interleavings, O(bound^(sources - 1)) states) or
+    # 'counter' (polynomial in sources * bound; faster for the implementation, slower under the abstraction's ForAll)
+    MERGER_ENCODING = 'interleaving'
+
     @staticmethod
     def Merger(nodes, bound):
+        if Channel.MERGER_ENCODING == 'interleaving':
+            return Channel.MergerInterleaving(nodes, bound)
+        return Channel.MergerCounter(nodes, bound)
+
+    @staticmethod
+    def MergerInterleaving(nodes, bound):
         assert len(nodes) >= 3
-        def MultiMergerInstance(Index = [0 for _ in range(len(nodes) - 1)]):
+        # Memoize on Index: states reached through different interleavings are shared
+        memo = {}
+        def MultiMergerInstance(Index = tuple(0 for _ in range(len(nodes) - 1))):
             if bound == sum(Index):
                 return True
+            if Index in memo:
+                return memo[Index]
             constraints = []
             for i in range(len(nodes) - 1):
                 temp = []
@@ -437,5 +515,167 @@ class Channel:
                     if j != i:
                         temp += [nodes[i]['time'][Index[i]] < nodes[j]['time'][Index[j]]]
                 constraints += [temp]
-            return Disjunction([And(Conjunction(constraints[i]), MultiMergerInstance(Index[:i] + [Index[i] + 1] + Index[i + 1:])) for i in range(len(nodes) - 1)])
+            memo[Index] = Disjunction([And(Conjunction(constraints[i]), MultiMergerInstance(Index[:i] + (Index[i] + 1,) + Index[i + 1:])) for i in range(len(nodes) - 1)])
+            return memo[Index]
         return MultiMergerInstance()
+
+    @staticmethod
+    def MergerCounter(nodes, bound):
+        # Same semantics as MergerInterleaving, but the state of each source (how many of its data items the sink
+        # has taken so far) is kept as a unary counter per sink slot instead of being enumerated.
+        # The size is O(sources * bound^2 + sources^2 * bound) and no fresh variables are introduced.
+        assert len(nodes) >= 3
+        sources = nodes[:-1]
+        sink = nodes[-1]
+
+        # pos[i][v]: source i has delivered exactly v data items before the current sink slot (v <= slot)
+        pos = [[BoolVal(True)] for _ in sources]
+        constraints = []
+        for m in range(bound):
+            # Data/time of the next pending item of each source
+            head_time, head_data = [], []
+            for src, p in zip(sources, pos):
+                time, data = src['time'][m], src['data'][m]
+                for v in range(m - 1, -1, -1):  # pos[i][m] is implied when no smaller count holds
+                    time = If(p[v], src['time'][v], time)
+                    data = If(p[v], src['data'][v], data)
+                head_time += [time]
+                head_data += [data]
+
+            # Source i wins slot m if its pending item is strictly earlier than every other pending item
+            won = [Conjunction([head_time[i] < head_time[j] for j in range(len(sources)) if j != i])
+                   for i in range(len(sources))]
+            constraints += [Disjunction([And(won[i], head_time[i] == sink['time'][m], head_data[i] == sink['data'][m])
+                                         for i in range(len(sources))])]
+
+            pos = [[And(p[0], Not(won[i]))] +
+                   [Or(And(p[v], Not(won[i])), And(p[v - 1], won[i])) for v in range(1, m + 1)] +
+                   [And(p[m], won[i])] for i, p in enumerate(pos)]
+
+        return Conjunction(constraints)
+
+
+def Choice(p):
+    """
+    A random draw that is true with probability p: a Boolean constant drawn now in 'sample' mode, otherwise a fresh
+    choice variable recorded in Channel.CHOICES
+    """
+    if Channel.PROBABILITY == 'sample':
+        return BoolVal(uniform(0, 1) <= p)
+    choice = Bool('#choice_' + str(len(Channel.CHOICES)))
+    Channel.CHOICES.append((choice, p))
+    return choice
+
+def Choose(choice, then, otherwise):
+    # `then` if the draw `choice` holds, otherwise `otherwise`; drawn constants pick their branch right away
+    if is_true(choice):
+        return then
+    if is_false(choice):
+        return otherwise
+    return If(choice, then, otherwise)
+
+def DataVar(name):
+    return Const(name, Channel.DATA_SORT)
+
+def dataRange(data):
+    """
+    Node data lies outside the reserved range 10..20, except for the special items the channels emit
+    """
+    tokens = [Channel.CORRUPTED, Channel.TIMEOUT, Channel.OFF, Channel.RESET, Channel.EXPIRE]
+    return Disjunction([data < 10, data > 20] + [data == token for token in tokens])
+
+def dataWidth(connectors, bound):
+    """
+    Width of the bit-vectors that can stand for the integer data of a check over `connectors` up to `bound`.
+    Channels only compare data for equality and with constants, and nodes exclude the reserved range 10..20
+    but for the special items (see dataRange), so the check keeps its verdict as long as every constant fits and there is a distinct free value for
+    every data variable of both sides.
+    """
+    constants = {0, 1, 9, 21, Channel.CORRUPTED, Channel.TIMEOUT, Channel.OFF, Channel.RESET, Channel.EXPIRE}
+    nodes = set()
+    for connector in connectors:
+        for chan, names in connector.channels:
+            nodes.update(names)
+            if '(' in chan:
+                constants.update(int(v) for v in re.findall(r'-?\d+', chan[chan.index('('):]))
+    reserved = set(range(10, 21))
+    variables = bound * len(nodes)
+
+    width = 6
+    while 2 ** (width - 1) <= max(abs(v) for v in constants) or \
+            2 ** width - len(reserved | constants) < variables:
+        width += 1
+    return width
+
+def useDataDomain(connectors, bound):
+    # Set the sort of the data variables for a check over `connectors` up to `bound`
+    if Channel.DATA_DOMAIN == 'bv':
+        Channel.DATA_SORT = BitVecSort(dataWidth(connectors, bound))
+    else:
+        Channel.DATA_SORT = IntSort()
+
+def TimeVar(name):
+    return Const(name, Channel.TIME_SORT)
+
+def timeConstant(t):
+    # A delay of `t` time units in the current time domain
+    if Channel.TIME_DOMAIN == 'int':
+        scaled = Fraction(str(t)) * Channel.TIME_SCALE
+        assert scaled.denominator == 1
+        return int(scaled)
+    return t
+
+def timeScale(connectors, bound):
+    """
+    Number of integer steps per time unit that keeps the verdict of a check of connectors[0] against the others
+    up to `bound`. All time constraints compare two time stamps, possibly shifted by a timer delay, so they only
+    see the integer parts of the differences and the order of the fractional parts. Scaling the delays to integers
+    and then giving every time stamp of connectors[0] (the existentially quantified ones) its own fraction leaves
+    a representative of every real behavior on the integer grid; the abstraction-only nodes stay real.
+    """
+    denominator = 1
+    nodes = {nd for _, names in connectors[0].channels for nd in names}
+    for connector in connectors:
+        for chan, _ in connector.channels:
+            if chan.split('(')[0] in Channel.TIMERS:
+                denominator = lcm(denominator, Fraction(chan[chan.index('(') + 1:chan.rindex(')')]).denominator)
+    return denominator * (bound * len(nodes) + 1)
+
+def useTimeDomain(connectors, bound):
+    # Set the sort and scale of the time variables for a check of connectors[0] against the others up to `bound`
+    if Channel.TIME_DOMAIN == 'int':
+        Channel.TIME_SORT = IntSort()
+        Channel.TIME_SCALE = timeScale(connectors, bound)
+    else:
+        Channel.TIME_SORT = RealSort()
+        Channel.TIME_SCALE = 1
+
+def useDomains(connectors, bound):
+    useDataDomain(connectors, bound)
+    useTimeDomain(connectors, bound)
+
+@lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def channelTemplate(channel, timeSorts, bound, mergerEncoding, dataSort, timeScale):
+    """
+    Encode a channel once over placeholder nodes whose time stamps have the sorts `timeSorts` ('Int' / 'Real');
+    mergerEncoding, dataSort and timeScale are only part of the cache key
+    """
+    placeholders = [{'time': [Const('#' + str(k) + '_t_' + str(i), IntSort() if sort == 'Int' else RealSort())
+                              for i in range(bound)],
+                     'data': [DataVar('#' + str(k) + '_d_' + str(i)) for i in range(bound)]}
+                    for k, sort in enumerate(timeSorts)]
+    return eval('Channel.' + channel)(placeholders, bound), placeholders
+
+def encodeChannel(channel, nodes, bound):
+    """
+    Constraints of `channel` (a name as written in a connector, e.g. 'Fifo1e(1)') over `nodes` up to `bound`:
+    its template instantiated with the variables of the nodes
+    """
+    if channel.split('(')[0] in Channel.RANDOMIZED:
+        return eval('Channel.' + channel)(nodes, bound)
+    timeSorts = tuple(str(node['time'][0].sort()) for node in nodes)
+    constraint, placeholders = channelTemplate(channel, timeSorts, bound, Channel.MERGER_ENCODING,
+                                               str(Channel.DATA_SORT), Channel.TIME_SCALE)
+    pairs = [(placeholder[key][i], node[key][i])
+             for placeholder, node in zip(placeholders, nodes) for key in ['time', 'data'] for i in range(bound)]
+    return substitute(constraint, *pairs)
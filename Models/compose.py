@@ -0,0 +1,124 @@
+from reo import Connector
+from cache import canonical_channels
+
+
+def shared_nodes(source_conn, target_conn):
+    return {nd for _, nodes in source_conn.channels for nd in nodes} & \
+           {nd for _, nodes in target_conn.channels for nd in nodes}
+
+
+def regions(connector, boundary):
+    """
+    Split the channels of a connector into regions: channels are in the same region if they are joined
+    through a node outside `boundary`. Returns a list of (channels, boundary nodes of the region).
+    """
+    parent = list(range(len(connector.channels)))
+
+    def find(k):
+        while parent[k] != k:
+            parent[k] = parent[parent[k]]
+            k = parent[k]
+        return k
+
+    owner = {}
+    for k, (_, nodes) in enumerate(connector.channels):
+        for nd in nodes:
+            if nd in boundary:
+                continue
+            if nd in owner:
+                parent[find(k)] = find(owner[nd])
+            else:
+                owner[nd] = k
+
+    members = {}
+    for k in range(len(connector.channels)):
+        members.setdefault(find(k), []).append(connector.channels[k])
+    return [(chans, {nd for _, nodes in chans for nd in nodes if nd in boundary}) for chans in members.values()]
+
+
+def match_regions(source_regions, target_regions):
+    """
+    Group the regions of both connectors so that every boundary node of a target region is a node of a
+    source region of the same group. Each target region joins the source regions that cover its boundary
+    nodes, preferring the ones that cover the most of them.
+    Returns a list of (source channels, target channels).
+    """
+    parent = list(range(len(source_regions) + len(target_regions)))
+
+    def find(k):
+        while parent[k] != k:
+            parent[k] = parent[parent[k]]
+            k = parent[k]
+        return k
+
+    for t, (_, target_boundary) in enumerate(target_regions):
+        uncovered = set(target_boundary)
+        while uncovered:
+            s = max(range(len(source_regions)), key=lambda s: len(source_regions[s][1] & uncovered))
+            if not source_regions[s][1] & uncovered:
+                break  # Nodes of no source region cannot be boundary nodes
+            parent[find(len(source_regions) + t)] = find(s)
+            uncovered -= source_regions[s][1]
+
+    groups = {}
+    for s, (chans, _) in enumerate(source_regions):
+        groups.setdefault(find(s), ([], []))[0].extend(chans)
+    for t, (chans, _) in enumerate(target_regions):
+        groups.setdefault(find(len(source_regions) + t), ([], []))[1].extend(chans)
+    return list(groups.values())
+
+
+def build(channels):
+    connector = Connector()
+    for chan, nodes in channels:
+        connector.connect(chan, *nodes)
+    return connector
+
+
+def identical(source_conn, target_conn, boundary):
+    """
+    Whether both connectors have the same channels up to the names of their internal nodes
+    """
+    source = canonical_channels(source_conn, boundary, '#')
+    target = canonical_channels(target_conn, boundary, '#')
+    return sorted(map(str, source)) == sorted(map(str, target))
+
+
+def split_check(source_conn, target_conn):
+    """
+    The sub-checks that together show source <= target: pairs of matching regions of both connectors that are
+    not syntactically identical. Returns (list of (source region, target region), number of regions).
+    A source region without a target counterpart is not constrained by the target and needs no check.
+    """
+    boundary = shared_nodes(source_conn, target_conn)
+    groups = match_regions(regions(source_conn, boundary), regions(target_conn, boundary))
+    checks = []
+    for source_chans, target_chans in groups:
+        source_region, target_region = build(source_chans), build(target_chans)
+        if target_chans == [] or identical(source_region, target_region, boundary):
+            continue
+        checks += [(source_region, target_region)]
+    return checks, len(groups)
+
+
+def check_compositional(source_conn, target_conn, bound, max_bound=None, stats=None):
+    """
+    Check source <= target region by region. Refinement of every region implies refinement of the whole
+    connector; if a region fails, its context may still rule the behavior out, so the whole connector is
+    checked to get the exact verdict.
+    Returns (result, bound, counter-example, (regions checked, regions)) with result/bound/counter-example as
+    returned by isRefinementOf (bound = `bound`) or isRefinementUpTo. All checks are recorded into `stats`.
+    """
+    checks, total = split_check(source_conn, target_conn)
+
+    def check(source, target):
+        if max_bound is None:
+            result, counterexample, _ = source.isRefinementOf(target, bound, stats)
+            return result, bound, counterexample
+        return source.isRefinementUpTo(target, max_bound, stats)
+
+    for source_region, target_region in checks:
+        result, depth, counterexample = check(source_region, target_region)
+        if result is not True:
+            return check(source_conn, target_conn) + ((len(checks), total),)
+    return True, bound if max_bound is None else max_bound, None, (len(checks), total)
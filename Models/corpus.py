@@ -0,0 +1,219 @@
+import argparse
+import fnmatch
+import json
+import os
+
+# Version of the index file format; indexes of other versions are rebuilt
+INDEX_VERSION = 1
+
+
+def parse_shard(text):
+    """
+    (i, n) of a shard given as 'i/n', the i-th of n shards (1 <= i <= n)
+    """
+    try:
+        index, count = (int(part) for part in text.split('/'))
+    except ValueError:
+        raise ValueError(f"shard '{text}' is not of the form i/n")
+    if not 1 <= index <= count:
+        raise ValueError(f"shard '{text}' needs 1 <= i <= n")
+    return index, count
+
+
+def select(names, patterns=None, shard=None):
+    """
+    The sorted names that match one of the glob `patterns` (all names without patterns) and fall into `shard`
+    ((i, n): every n-th of them, starting with the i-th), so that n machines split a corpus between them
+    """
+    names = sorted(names)
+    if patterns:
+        names = [name for name in names if any(fnmatch.fnmatchcase(name, pattern) for pattern in patterns)]
+    if shard is not None:
+        index, count = shard
+        names = names[index - 1::count]
+    return names
+
+
+class ModuleCorpus:
+    """
+    The cases defined in a Python module (by default test_cases.py): every variable test_* that is a pair
+    (spec channels, impl channels). The module (and with it z3) is only imported once the cases are needed.
+    """
+    def __init__(self, module='test_cases'):
+        self.module = module
+        self.cases = None
+
+    def load_all(self):
+        if self.cases is None:
+            module = __import__(self.module)
+            self.cases = {}
+            for name in dir(module):
+                if name.startswith("test_"):
+                    val = getattr(module, name)
+                    if isinstance(val, tuple) and len(val) == 2:
+                        self.cases[name] = val
+        return self.cases
+
+    def names(self):
+        return sorted(self.load_all().keys())
+
+    def load(self, names):
+        cases = self.load_all()
+        for name in names:
+            yield name, cases[name]
+
+
+class Corpus:
+    """
+    Cases stored as JSON lines {"name": .., "spec": [channels], "impl": [channels]}, in one .jsonl file or in
+    the .jsonl files of a directory (and its subdirectories). Channels are written as for
+    automerger.define_connector, e.g. "Fifo1 A B".
+    An index of the case names and their file offsets is kept next to the corpus (FILE.index, or index.json in
+    the directory) and rebuilt when a file of the corpus changed, so listing and picking cases does not parse
+    the whole corpus.
+    """
+    def __init__(self, path):
+        self.path = path
+        if os.path.isdir(path):
+            self.index_path = os.path.join(path, 'index.json')
+        else:
+            self.index_path = path + '.index'
+        self.index = None
+
+    def files(self):
+        # Files of the corpus, relative to its directory, in sorted order
+        if not os.path.isdir(self.path):
+            return [os.path.basename(self.path)]
+        files = []
+        for directory, _, names in os.walk(self.path):
+            files += [os.path.relpath(os.path.join(directory, name), self.path) for name in names if name.endswith('.jsonl')]
+        return sorted(files)
+
+    def location(self, file):
+        return os.path.join(self.path if os.path.isdir(self.path) else os.path.dirname(self.path), file)
+
+    def stamps(self):
+        # Size and modification time of every file, to tell whether the index is stale
+        stamps = {}
+        for file in self.files():
+            status = os.stat(self.location(file))
+            stamps[file] = [status.st_size, status.st_mtime_ns]
+        return stamps
+
+    def records(self, file):
+        """
+        Stream (offset, record) of the cases of one file; blank lines are skipped
+        """
+        with open(self.location(file), 'rb') as f:
+            offset = 0
+            for number, line in enumerate(f, start=1):
+                if line.strip():
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError as e:
+                        raise ValueError(f"{file}:{number}: {e}")
+                    if not isinstance(record, dict) or not {'name', 'spec', 'impl'} <= record.keys():
+                        raise ValueError(f"{file}:{number}: a case needs 'name', 'spec' and 'impl'")
+                    yield offset, record
+                offset += len(line)
+
+    def build_index(self):
+        """
+        Scan the corpus and write its index: {case name: [file, offset]}
+        """
+        cases = {}
+        for file in self.files():
+            for offset, record in self.records(file):
+                if record['name'] in cases:
+                    raise ValueError(f"{file}: case '{record['name']}' is also defined in {cases[record['name']][0]}")
+                cases[record['name']] = [file, offset]
+        self.index = {'version': INDEX_VERSION, 'files': self.stamps(), 'cases': cases}
+        try:
+            with open(self.index_path, 'w') as f:
+                json.dump(self.index, f)
+        except OSError:
+            pass  # A read-only corpus is indexed on every run
+        return self.index
+
+    def load_index(self):
+        if self.index is None:
+            try:
+                with open(self.index_path) as f:
+                    index = json.load(f)
+                if index.get('version') == INDEX_VERSION and index['files'] == self.stamps():
+                    self.index = index
+            except (OSError, ValueError, KeyError):
+                pass
+        if self.index is None:
+            self.build_index()
+        return self.index
+
+    def names(self):
+        return sorted(self.load_index()['cases'].keys())
+
+    def load(self, names):
+        """
+        Stream (name, (spec channels, impl channels)) of the cases `names`, each read at its offset when it is due
+        """
+        cases = self.load_index()['cases']
+        for name in names:
+            file, offset = cases[name]
+            with open(self.location(file), 'rb') as f:
+                f.seek(offset)
+                record = json.loads(f.readline())
+            yield name, (record['spec'], record['impl'])
+
+
+def open_corpus(path=None):
+    # The corpus at `path`, or the cases of test_cases.py
+    return ModuleCorpus() if path is None else Corpus(path)
+
+
+def export(corpus, names, out):
+    """
+    Write the cases `names` of a corpus as JSON lines to the file `out`
+    """
+    with open(out, 'w') as f:
+        for name, (spec_list, impl_list) in corpus.load(names):
+            f.write(json.dumps({'name': name, 'spec': list(spec_list), 'impl': list(impl_list)}) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Index, list and export case corpora (JSON lines)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    index = commands.add_parser("index", help="(Re)build the index of a corpus")
+    index.add_argument("corpus", help="A .jsonl file or a directory of them")
+
+    listing = commands.add_parser("list", help="List the cases of a corpus, from its index")
+    listing.add_argument("corpus", nargs="?", help="A .jsonl file or a directory of them (default: test_cases.py)")
+
+    exporting = commands.add_parser("export", help="Write the cases of a corpus as JSON lines")
+    exporting.add_argument("out", help="The .jsonl file to write")
+    exporting.add_argument("--corpus", help="A .jsonl file or a directory of them (default: test_cases.py)")
+
+    for command in [listing, exporting]:
+        command.add_argument("--filter", action="append", metavar="GLOB", help="Only the cases whose names match GLOB (repeatable)")
+        command.add_argument("--shard", help="Only the i-th of n shards of the cases, as i/n")
+    args = parser.parse_args()
+
+    try:
+        if args.command == "index":
+            print(f"{len(Corpus(args.corpus).build_index()['cases'])} cases indexed")
+            return
+        shard = None if args.shard is None else parse_shard(args.shard)
+        corpus = open_corpus(args.corpus)
+        names = select(corpus.names(), args.filter, shard)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.command == "list":
+        for name in names:
+            print(name)
+    else:
+        export(corpus, names, args.out)
+        print(f"{len(names)} cases written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+from reo import Connector, Channel
+
+# Channels whose ends all take data in / all put data out. Every other channel takes data in at all of its
+# ends but the last one and puts it out at the last one (e.g. Merger: several source ends, one sink end).
+DRAINS = {'SyncDrain', 'AsynDrain'}
+SPOUTS = {'SyncSpout', 'AsynSpout'}
+
+
+def channel_ends(channel, nodes):
+    """
+    (source ends, sink ends) of a channel: the nodes it takes data from and the nodes it puts data into
+    """
+    base = channel.split('(')[0]
+    if base in DRAINS:
+        return list(nodes), []
+    if base in SPOUTS:
+        return [], list(nodes)
+    return list(nodes[:-1]), [nodes[-1]]
+
+
+class ConnectorGraph:
+    """
+    Index of the channels of a connector: the channels at every node, at which of their ends,
+    and the connected components
+    """
+    def __init__(self, channels):
+        self.channels = [(chan, tuple(nodes)) for chan, nodes in channels]
+        self.uses = {}     # node -> indices of the channels at the node
+        self.readers = {}  # node -> indices of the channels that take data from the node
+        self.writers = {}  # node -> indices of the channels that put data into the node
+        for k, (chan, nodes) in enumerate(self.channels):
+            sources, sinks = channel_ends(chan, nodes)
+            for nd in nodes:
+                self.uses.setdefault(nd, [])
+                if k not in self.uses[nd]:
+                    self.uses[nd].append(k)
+                self.readers.setdefault(nd, [])
+                self.writers.setdefault(nd, [])
+            for nd in sources:
+                self.readers[nd].append(k)
+            for nd in sinks:
+                self.writers[nd].append(k)
+
+    @staticmethod
+    def of(connector):
+        return ConnectorGraph(connector.channels)
+
+    def role(self, node):
+        """
+        'source' if the environment writes into the node (no channel puts data into it), 'sink' if the
+        environment reads from it (no channel takes data from it), 'mixed' otherwise
+        """
+        if self.writers[node] == []:
+            return 'source'
+        if self.readers[node] == []:
+            return 'sink'
+        return 'mixed'
+
+    def boundary(self):
+        # The source and sink nodes, in order of first appearance
+        return [nd for nd in self.uses if self.role(nd) != 'mixed']
+
+    def components(self):
+        """
+        Indices of the channels of every connected component (channels sharing a node are connected)
+        """
+        component = {}
+        result = []
+        for start in range(len(self.channels)):
+            if start in component:
+                continue
+            component[start] = len(result)
+            members = [start]
+            stack = [start]
+            while stack:
+                k = stack.pop()
+                for nd in self.channels[k][1]:
+                    for other in self.uses[nd]:
+                        if other not in component:
+                            component[other] = len(result)
+                            members.append(other)
+                            stack.append(other)
+            result += [sorted(members)]
+        return result
+
+    def connector(self, indices=None):
+        # A Connector of the given channels (all by default), in their original order
+        result = Connector()
+        for k in (range(len(self.channels)) if indices is None else sorted(indices)):
+            result.connect(self.channels[k][0], *self.channels[k][1])
+        return result
+
+
+def satisfiable(connector, bound):
+    """
+    Whether a connector has any behavior of `bound` steps
+    """
+    solver, _ = connector.behaviorSolver(bound)
+    return str(solver.check()) == 'sat'
+
+
+def cone_of_influence(connector, observable, bounds):
+    """
+    Drop the connected components of a connector that have no `observable` node and a behavior for each of
+    `bounds`: their nodes are all internal, so they neither constrain nor are constrained by the rest.
+    A component without behaviors is kept, since it leaves the whole connector without behaviors, and so is
+    one with randomized channels, whose behaviors change with every encoding.
+    """
+    graph = ConnectorGraph.of(connector)
+    kept = []
+    for component in graph.components():
+        if any(nd in observable for k in component for nd in graph.channels[k][1]) or \
+                any(graph.channels[k][0].split('(')[0] in Channel.RANDOMIZED for k in component) or \
+                not all(satisfiable(graph.connector(component), bound) for bound in bounds):
+            kept += component
+    return graph.connector(kept)
+
+
+def reduce_pair(source_conn, target_conn, bounds):
+    """
+    Cone-of-influence reduction of both sides of a refinement check for every bound in `bounds`;
+    the nodes they share are the observable ones
+    """
+    observable = set(ConnectorGraph.of(source_conn).uses) & set(ConnectorGraph.of(target_conn).uses)
+    return cone_of_influence(source_conn, observable, bounds), cone_of_influence(target_conn, observable, bounds)
@@ -0,0 +1,160 @@
+import re
+import time
+
+from z3 import And, BoolVal, Const, Not, substitute
+
+from channel import Channel, Conjuncts, encodeChannel, useDomains
+from reo import Connector, extendNode, freeConstants, newSolver, quantified
+
+# Bound at which the encodings are probed for being windowed (see window)
+PROBE = 8
+
+# Channels whose encodings add the same constraints for every step (one loop over the steps, constraints between
+# consecutive steps only), so that the windowed shape window finds at the probed bounds holds at every bound
+UNIFORM = {'Sync', 'Fifo1', 'Fifo1e', 'SyncDrain', 'Producerp', 'SyncSpout', 'Timert'}
+
+STEP_VARIABLE = re.compile(r'^(.*)_([td])_(\d+)$')
+
+
+def step_indices(term):
+    """
+    The steps (trace indices) of the node variables in `term`, or None if it has other variables
+    """
+    indices = set()
+    for v in freeConstants([term]):
+        match = STEP_VARIABLE.match(str(v))
+        if match is None:
+            return None
+        indices.add(int(match.group(3)))
+    return indices
+
+
+def encode(connector, bound, nodes):
+    """
+    The conjuncts of the channel and node constraints of `connector` up to `bound`, over `nodes` (extended as needed).
+    Node variables are named by node and step, so encodings over different `nodes` share them.
+    """
+    conjuncts = []
+    for chan, names in connector.channels:
+        for nd in names:
+            if nd not in nodes:
+                nodes[nd] = {'time': [], 'data': []}
+                conjuncts += extendNode(nd, nodes[nd], bound)
+        conjuncts += Conjuncts(encodeChannel(chan, [nodes[nd] for nd in names], bound))
+    return [c for c in conjuncts if not c.eq(BoolVal(True))]
+
+
+def shift(term, offset):
+    # `term` with every node variable moved `offset` steps
+    pairs = []
+    for v in freeConstants([term]):
+        node, kind, index = STEP_VARIABLE.match(str(v)).groups()
+        pairs += [(v, Const(f"{node}_{kind}_{int(index) + offset}", v.sort()))]
+    return substitute(term, *pairs) if pairs else term
+
+
+def window(connector):
+    """
+    The width w of the encoding of `connector` if it is windowed, otherwise None. Windowed means that, probed at
+    bounds PROBE and PROBE + 1:
+    - every conjunct only relates node variables of at most w consecutive steps,
+    - the encoding of a bound contains that of the bound before (it is prefix-closed), and
+    - from step w on, the conjuncts are the same at every step (shifting them by one step gives the conjuncts
+      one step later).
+    The encoding at any bound is then the initial conjuncts plus the same conjuncts over each window of w steps.
+    """
+    if any(chan.split('(')[0] in Channel.RANDOMIZED for chan, _ in connector.channels):
+        return None
+    before = encode(connector, PROBE, {})
+    after = encode(connector, PROBE + 1, {})
+    steps = {}
+    for c in before + after:
+        indices = step_indices(c)
+        if indices is None or indices == set():
+            return None
+        steps[c.get_id()] = indices
+
+    width = max(max(steps[c.get_id()]) - min(steps[c.get_id()]) + 1 for c in after)
+    if 2 * width > PROBE or width > max(max(steps[c.get_id()]) - min(steps[c.get_id()]) + 1 for c in before):
+        # The span of the conjuncts grows with the bound
+        return None
+
+    ids = {c.get_id() for c in after}
+    if any(c.get_id() not in ids for c in before):
+        return None
+    ids = {c.get_id() for c in before}
+    if any(min(steps[c.get_id()]) > width and shift(c, -1).get_id() not in ids for c in after):
+        return None
+    ids = {c.get_id() for c in after}
+    if any(min(steps[c.get_id()]) >= width and shift(c, 1).get_id() not in ids for c in before):
+        return None
+    return width
+
+
+def inductive_step(source_conn, target_conn, start, width, k):
+    """
+    Whether the refinement obligation of one more step follows from that of the k steps before, on a segment of
+    windows that starts at step `start` (past the initial conjuncts) and ends at the last step T - 1:
+    the conjuncts of source within the segment and of target ending before T - 1 imply those of target ending
+    at T - 1. The segment also gets the invariant that its time stamps are positive (they start at 0 and increase).
+    No invariant on the occupancy of Fifo1 buffers is needed: the segment keeps every Fifo1 conjunct from `start`
+    on, so each buffer holds one item at a time within it (in[i] < out[i] < in[i + 1]), and the only occupancy
+    conjunct it drops relates step `start` to the step before, which no goal conjunct mentions.
+    Returns 'unsat' if the step holds, otherwise the solver's answer.
+    """
+    bound = start + width + k - 1
+    nodes = {}
+    source = [c for c in encode(source_conn, bound, nodes) if min(step_indices(c)) >= start]
+    target = [c for c in encode(target_conn, bound, nodes) if min(step_indices(c)) >= start]
+    assumed = [c for c in target if max(step_indices(c)) < bound - 1]
+    goal = [c for c in target if max(step_indices(c)) == bound - 1]
+    invariant = [nodes[nd]['time'][start] > 0 for nd in sorted({nd for _, names in source_conn.channels for nd in names})]
+
+    solver = newSolver(False)
+    solver.add(source + assumed + invariant + [Not(And(goal + [BoolVal(True)]))])
+    return str(solver.check())
+
+
+def check_inductive(source_conn, target_conn, max_k, stats=None):
+    """
+    Prove source <= target for every bound by k-induction, for k up to max_k.
+    Both connectors must be built from UNIFORM channels with windowed encodings (see window), and the check
+    quantifier-free with real time and unbounded integer data, the domains that do not depend on the bound;
+    otherwise induction does not apply. For the first k whose inductive step holds, the base case (every bound up to the end of the
+    segment of the step) is checked with isRefinementUpTo.
+    Returns (True, k, None, None) if refinement holds for every bound, (False, bound, counter-example, None)
+    if the base case fails at `bound`, or (None, None, None, reason) if induction is not conclusive.
+    """
+    if quantified(source_conn, target_conn):
+        return None, None, None, "the specification has nodes of its own"
+    if Channel.TIME_DOMAIN != 'real' or Channel.DATA_DOMAIN != 'int':
+        return None, None, None, "bounded time or data domain"
+    for chan, _ in source_conn.channels + target_conn.channels:
+        if chan.split('(')[0] not in UNIFORM:
+            return None, None, None, f"{chan} is not encoded step by step"
+
+    start = time.perf_counter()
+    useDomains([source_conn, target_conn], PROBE + 1)
+    widths = [window(source_conn), window(target_conn)]
+    if stats is not None:
+        stats.addTime('induction', time.perf_counter() - start)
+    if None in widths:
+        return None, None, None, "not a windowed encoding"
+    width = max(widths)
+
+    for k in range(1, max_k + 1):
+        start = time.perf_counter()
+        result = inductive_step(source_conn, target_conn, width, width, k)
+        if stats is not None:
+            stats.addTime('induction', time.perf_counter() - start)
+        if result != 'unsat':
+            continue
+        base = 2 * width + k - 1
+        holds, depth, counterexample = source_conn.isRefinementUpTo(target_conn, base, stats)
+        if holds is None:
+            return None, None, None, f"the solver gave up on the base case at bound {depth}"
+        if not holds:
+            return False, depth, counterexample, None
+        Connector.CONFIGURATION += f", {k}-induction"
+        return True, k, None, None
+    return None, None, None, f"no inductive step up to k = {max_k}"
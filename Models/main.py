@@ -1,41 +1,32 @@
 import argparse
-import test_cases
-from automerger import define_connector
+import os
+import random
+# The modules that import z3 are imported once they are needed, so that --list of a corpus is served from its index
+from corpus import open_corpus, parse_shard, select
 
 BOUND = 10 
 
-def get_available_cases():
-    cases = {}
-    for name in dir(test_cases):
-        if name.startswith("test_"):
-            val = getattr(test_cases, name)
-            if isinstance(val, tuple) and len(val) == 2:
-                cases[name] = val
-    return cases
-
-def run_single_check(source_conn, target_conn, source_name, target_name):
+def run_single_check(source_conn, target_conn, source_name, target_name, bound=BOUND, max_bound=None, cache=None, stats=False, session=None):
     """
     Check if source connector is a refinement of target connector: source <= target ?
+    With max_bound, check every bound from 1 to max_bound and report the first failing one.
+    Returns the outcome of the check (see runner.run_check).
     """
-    print(f"  Checking: {source_name} <= {target_name} ...", end=" ", flush=True)
-    
-    result, counterexample, smt = source_conn.isRefinementOf(target_conn, BOUND)
+    from runner import run_check, check_label, print_verdict
+    print(check_label(source_name, target_name, max_bound), end=" ", flush=True)
 
-    if result:
-        print("\033[92m[TRUE]\033[0m") # Green -> TRUE
-    else:
-        print("\033[91m[FALSE]\033[0m") # Red -> FALSE
-        if counterexample:
-            print(f"    Counter-example found:\n{counterexample}")
-        else:
-            print(f"    (Counter-example found by Z3)")
+    outcome = run_check(source_conn, target_conn, bound, max_bound, cache, stats, session)
+    print_verdict(outcome, max_bound)
+    return outcome
 
-def run_experiment(case_name, case_data):
+def run_experiment(case_name, case_data, bound=BOUND, max_bound=None, cache=None, stats=False, session=None):
     """
     Run a single experiment, containing two directions of checks:
     1. Implementation Refines Specification? (Impl <= Spec)
     2. Specification Refines Implementation? (Spec <= Impl)
+    Returns the outcomes of both checks.
     """
+    from automerger import define_connector
     spec_list, impl_list = case_data
     
     print(f"\n{'='*60}")
@@ -50,38 +41,183 @@ def run_experiment(case_name, case_data):
     impl_conn = res_impl
 
     # Impl <= Spec
-    run_single_check(impl_conn, spec_conn, "Impl", "Spec")
+    forward = run_single_check(impl_conn, spec_conn, "Impl", "Spec", bound, max_bound, cache, stats, session)
 
     # Spec <= Impl
-    run_single_check(spec_conn, impl_conn, "Spec", "Impl")
+    backward = run_single_check(spec_conn, impl_conn, "Spec", "Impl", bound, max_bound, cache, stats, session)
     print("")
+    return [forward, backward]
 
 def main():
     parser = argparse.ArgumentParser(description="Reo Connector Refinement Checker")
     parser.add_argument("case_name", nargs="?", help="Name of the test case to run (e.g., test_basic_01)")
     parser.add_argument("--all", action="store_true", help="Run all test cases")
     parser.add_argument("--list", action="store_true", help="List all available test cases")
+    parser.add_argument("--cases", metavar="CORPUS",
+                        help="Take the test cases from a JSON-lines corpus (a .jsonl file or a directory of them) instead of test_cases.py")
+    parser.add_argument("--filter", action="append", metavar="GLOB",
+                        help="With --all or --list, only the test cases whose names match GLOB (repeatable)")
+    parser.add_argument("--shard", metavar="I/N", help="With --all or --list, only the I-th of N shards of the test cases")
+    parser.add_argument("--bound", type=int, default=BOUND, help=f"Trace length used by the refinement checks (default: {BOUND})")
+    parser.add_argument("--max-bound", type=int, help="Check every bound from 1 to MAX_BOUND incrementally and report the first failing one")
+    parser.add_argument("--merger", choices=["counter", "interleaving"], default="interleaving",
+                        help="Merger encoding: interleaving enumeration (default) or polynomial counters")
+    parser.add_argument("--engine", choices=["mbqi", "cegar", "lazy"], default="mbqi",
+                        help="Solve the refinement query as one ForAll (mbqi, default), as a CEGAR loop of two quantifier-free solvers, "
+                             "or with the channels of the refining side added on demand (lazy)")
+    parser.add_argument("--data", choices=["int", "bv"], default="int",
+                        help="Node data as unbounded integers (default) or as bit-vectors sized for each check")
+    parser.add_argument("--time", choices=["real", "int"], default="real",
+                        help="Time stamps as reals (default) or as integers scaled for each check")
+    parser.add_argument("--logic", default="auto",
+                        help="Logic of the solvers: auto (default; QF_IDL for quantifier-free checks with --time int), default (Z3's choice) or an SMT-LIB logic")
+    parser.add_argument("--portfolio", nargs="?", const="mbqi,qe-smt,seed:1,seed:2",
+                        help="Race the solver configurations of this comma-separated list (mbqi, no-mbqi, qe-smt, ematching, seed:N) "
+                             "in separate processes and take the first answer (default list: mbqi,qe-smt,seed:1,seed:2)")
+    parser.add_argument("--no-rewrite", action="store_true", help="Encode the connectors as written, without collapsing Sync chains and dropping hidden nodes")
+    parser.add_argument("--compositional", action="store_true", help="Check refinement region by region along the shared nodes, skipping identical regions")
+    parser.add_argument("--session", action="store_true",
+                        help="Encode every connector once and share the encodings between both directions and across cases "
+                             "(single-bound mbqi checks only: not with --jobs, --engine cegar/lazy, --portfolio, --max-bound or --compositional)")
+    parser.add_argument("--stats", "--profile", action="store_true",
+                        help="Time every phase of the checks (always running the solver) and print a summary at the end")
+    parser.add_argument("--jobs", type=int, help="Run the checks in a pool of JOBS processes")
+    parser.add_argument("--timeout", type=float, help="Wall-clock limit in seconds per check (requires --jobs); overdue checks are reported as unknown")
+    parser.add_argument("--memory", type=int, help="Memory limit in MB per check (requires --jobs)")
+    parser.add_argument("--samples", type=int,
+                        help="Check SAMPLES random draws of the probabilistic channels (in a pool of --jobs processes) and report the fraction that refines")
+    parser.add_argument("--seed", type=int, help="Random seed of the probabilistic channels (with --samples, sample k uses SEED + k; default 0)")
+    parser.add_argument("--induction", type=int, nargs="?", const=4, metavar="K",
+                        help="First try to prove each check for every bound by k-induction with k up to K (default: 4), "
+                             "falling back to the bounded check")
+    parser.add_argument("--exact", action="store_true",
+                        help="Compute the exact probability of refinement over the random draws of the probabilistic channels (single bound)")
+    parser.add_argument("--emit-smt2", metavar="DIR",
+                        help="Write the query of every check to DIR as an SMT-LIB file instead of solving it (see batch.py)")
+    parser.add_argument("--cache", help="File of the persistent verdict cache (default: .refinement_cache.sqlite next to main.py)")
+    parser.add_argument("--cache-size", type=int, default=64, help="Size limit of the verdict cache in MB (default: 64)")
+    parser.add_argument("--no-cache", action="store_true", help="Always run the solver, without reading or writing the verdict cache")
     
     args = parser.parse_args()
-    available_cases = get_available_cases()
+    if args.bound < 1:
+        parser.error("--bound must be at least 1")
+    if args.max_bound is not None and args.max_bound < 1:
+        parser.error("--max-bound must be at least 1")
+    # Only the processes of the --jobs pool are limited
+    for option, limit in {"--timeout": args.timeout, "--memory": args.memory}.items():
+        if limit is not None and (args.jobs is None or args.samples is not None or args.emit_smt2 is not None):
+            parser.error(f"{option} limits the checks run with --jobs (not with --samples or --emit-smt2)")
+    try:
+        corpus = open_corpus(args.cases)
+        available = corpus.names()
+        shard = None if args.shard is None else parse_shard(args.shard)
+    except ValueError as e:
+        parser.error(str(e))
+    selected_names = select(available, args.filter, shard) if args.all or args.list else \
+        [args.case_name] if args.case_name in available else []
 
     # List all available test cases
     if args.list:
         print("Available test cases:")
-        for name in sorted(available_cases.keys()):
+        for name in selected_names:
             print(f" - {name}")
         return
 
+    from automerger import define_connector
+    from reo import Connector, Channel
+    from cache import ResultCache, DEFAULT_PATH
+    from portfolio import configuration
+    from session import RefinementSession
+    from montecarlo import run_samples, print_samples
+    from runner import DIRECTIONS, emit_check, run_parallel, check_label, aggregate_stats, print_stats
+
+    Channel.MERGER_ENCODING = args.merger
+    Connector.ENGINE = args.engine
+    Connector.REWRITE = not args.no_rewrite
+    Connector.COMPOSITIONAL = args.compositional
+    Channel.DATA_DOMAIN = args.data
+    Channel.TIME_DOMAIN = args.time
+    Connector.LOGIC = args.logic
+    Connector.EXACT = args.exact
+    Connector.INDUCTION = args.induction
+    if args.exact and args.max_bound is not None:
+        parser.error("--exact runs single-bound checks; use --bound instead of --max-bound")
+    if args.portfolio is not None:
+        Connector.PORTFOLIO = args.portfolio.split(",")
+        for name in Connector.PORTFOLIO:
+            try:
+                configuration(name)
+            except ValueError as e:
+                parser.error(str(e))
+    if args.session:
+        # The session shares the encodings of single-bound mbqi checks solved in this process
+        ignored = {f"--engine {args.engine}": args.engine != 'mbqi', "--portfolio": args.portfolio is not None,
+                   "--max-bound": args.max_bound is not None, "--compositional": args.compositional,
+                   "--jobs": args.jobs is not None, "--exact": args.exact, "--samples": args.samples is not None,
+                   "--emit-smt2": args.emit_smt2 is not None}
+        for option, given in ignored.items():
+            if given:
+                parser.error(f"--session does not apply with {option}")
+    if args.seed is not None:
+        random.seed(args.seed)
+    cache = None if args.no_cache else ResultCache(args.cache or DEFAULT_PATH, args.cache_size)
+
+    # Sample the probabilistic channels of the selected test cases
+    if args.samples is not None and selected_names:
+        if args.max_bound is not None:
+            parser.error("--samples runs single-bound checks; use --bound instead of --max-bound")
+        for name, case_data in corpus.load(selected_names):
+            print(f"\n{'='*60}")
+            print(f"Running Experiment: {name}")
+            print(f"{'='*60}")
+            for direction in DIRECTIONS:
+                print(check_label(*direction), end=" ", flush=True)
+                print_samples(run_samples(case_data, direction, args.bound, args.samples,
+                                          args.seed or 0, args.jobs or 1))
+            print("")
+        return
+
+    # Write the queries of the selected test cases
+    if args.emit_smt2 is not None and selected_names:
+        if args.max_bound is not None:
+            parser.error("--emit-smt2 writes single-bound checks; use --bound instead of --max-bound")
+        os.makedirs(args.emit_smt2, exist_ok=True)
+        for name, (spec_list, impl_list) in corpus.load(selected_names):
+            connectors = {"Spec": define_connector(spec_list)[0], "Impl": define_connector(impl_list)[0]}
+            for source_name, target_name in DIRECTIONS:
+                path = os.path.join(args.emit_smt2, f"{name}.{source_name}_{target_name}.smt2")
+                emit_check(connectors[source_name], connectors[target_name], args.bound, path,
+                           {'case': name, 'source': source_name, 'target': target_name})
+                print(path)
+        return
+
+    # Run the selected test cases in parallel
+    if args.jobs is not None and selected_names:
+        results = run_parallel(dict(corpus.load(selected_names)), args.jobs, args.bound, args.max_bound, args.timeout, args.memory, cache, args.stats)
+        if args.stats:
+            print_stats(aggregate_stats(outcome for outcomes in results.values() for outcome in outcomes.values()))
+        return
+
+    session = None
+    if args.session and selected_names:
+        selected = [case for _, case in corpus.load(selected_names)]
+        session = RefinementSession(args.bound, [define_connector(side)[0] for case in selected for side in case])
+
     # Run all test cases
     if args.all:
-        for name in sorted(available_cases.keys()):
-            run_experiment(name, available_cases[name])
+        outcomes = []
+        for name, case_data in corpus.load(selected_names):
+            outcomes += run_experiment(name, case_data, args.bound, args.max_bound, cache, args.stats, session)
+        if args.stats:
+            print_stats(aggregate_stats(outcomes))
         return
 
     # Run a single test case
     if args.case_name:
-        if args.case_name in available_cases:
-            run_experiment(args.case_name, available_cases[args.case_name])
+        if selected_names:
+            outcomes = run_experiment(args.case_name, dict(corpus.load(selected_names))[args.case_name], args.bound, args.max_bound, cache, args.stats, session)
+            if args.stats:
+                print_stats(aggregate_stats(outcomes))
         else:
             print(f"Error: Test case '{args.case_name}' not found.")
             print("Use --list to see available cases.")
@@ -0,0 +1,107 @@
+import math
+import multiprocessing
+import random
+
+from z3 import BoolVal, Z3Exception, substitute
+
+from automerger import define_connector
+from reo import Channel, getSettings, applySettings, newSolver, quantified
+from runner import prepare_pair
+
+# z of the two-sided 95% confidence intervals
+Z95 = 1.959963984540054
+
+
+def draw(choices, seed):
+    # The values of the choice variables (Channel.CHOICES) in sample `seed`: each is true with its probability
+    rng = random.Random(seed)
+    return [(choice, BoolVal(rng.random() < p)) for choice, p in choices]
+
+
+def sample_worker(case_data, direction, bound, settings, seeds):
+    """
+    Check one direction of a case for every sample of `seeds` in a worker process and return the verdicts
+    (True, False, or None if the solver gave up), in order.
+    The check is encoded once with symbolic choices. A quantifier-free query gets the values of a sample pushed
+    on its solver; a query with a ForAll gets a fresh solver over the encoding with the values substituted,
+    since Z3's incremental core is orders of magnitude slower on some quantified queries (see session.py).
+    """
+    applySettings(settings)
+    Channel.PROBABILITY = 'symbolic'
+    spec_list, impl_list = case_data
+    connectors = {"Spec": define_connector(spec_list)[0], "Impl": define_connector(impl_list)[0]}
+    source, target = prepare_pair(connectors[direction[0]], connectors[direction[1]], bound)
+
+    Channel.CHOICES = []
+    solver = source.refinementSolver(target, bound)
+    choices = list(Channel.CHOICES)
+    isQuantified = quantified(source, target)
+    assertions = solver.assertions()
+
+    # Without choices, every sample is the same check
+    verdicts = []
+    for seed in (seeds if choices else seeds[:1]):
+        values = draw(choices, seed)
+        try:
+            if isQuantified:
+                sampled = newSolver(True)
+                sampled.add([substitute(assertion, *values) if values else assertion for assertion in assertions])
+                result = str(sampled.check())
+            else:
+                solver.push()
+                solver.add([choice == value for choice, value in values])
+                result = str(solver.check())
+                solver.pop()
+        except Z3Exception:
+            result = 'unknown'
+        verdicts += [True if result == 'unsat' else False if result == 'sat' else None]
+    return verdicts if choices else verdicts * len(seeds)
+
+
+def wilson_interval(successes, trials, z=Z95):
+    # Wilson score interval of a binomial proportion
+    if trials == 0:
+        return 0.0, 1.0
+    fraction = successes / trials
+    denominator = 1 + z * z / trials
+    center = (fraction + z * z / (2 * trials)) / denominator
+    margin = z * math.sqrt(fraction * (1 - fraction) / trials + z * z / (4 * trials * trials)) / denominator
+    return max(0.0, center - margin), min(1.0, center + margin)
+
+
+def run_samples(case_data, direction, bound, samples, seed=0, jobs=1):
+    """
+    Check one direction of a case for `samples` draws of its probabilistic channels, sample k drawing with the
+    random seed `seed` + k, in a pool of `jobs` processes that each encode the check once for a chunk of samples.
+    Returns {'holds': .., 'fails': .., 'unknown': .., 'samples': .., 'fraction': .., 'interval': (low, high)},
+    the fraction of the samples that refine and its 95% Wilson interval being over the decided samples.
+    """
+    seeds = list(range(seed, seed + samples))
+    jobs = max(1, min(jobs, samples))
+    chunks = [seeds[k::jobs] for k in range(jobs)]
+    settings = getSettings()
+    arguments = [(case_data, direction, bound, settings, chunk) for chunk in chunks]
+    if jobs == 1:
+        verdicts = [sample_worker(*arguments[0])]
+    else:
+        with multiprocessing.Pool(jobs) as pool:
+            verdicts = pool.starmap(sample_worker, arguments)
+
+    verdicts = [verdict for chunk in verdicts for verdict in chunk]
+    holds, fails = verdicts.count(True), verdicts.count(False)
+    decided = holds + fails
+    return {'holds': holds, 'fails': fails, 'unknown': samples - decided, 'samples': samples,
+            'fraction': holds / decided if decided else None, 'interval': wilson_interval(holds, decided)}
+
+
+def print_samples(outcome):
+    """
+    Print the outcome of run_samples after a check label
+    """
+    if outcome['fraction'] is None:
+        print(f"\033[93m[UNKNOWN]\033[0m (the solver gave up on all {outcome['samples']} samples)")
+        return
+    low, high = outcome['interval']
+    unknown = f", {outcome['unknown']} unknown" if outcome['unknown'] else ""
+    print(f"holds in {outcome['holds']}/{outcome['holds'] + outcome['fails']} samples{unknown}: "
+          f"{100 * outcome['fraction']:.1f}% (95% CI {100 * low:.1f}%-{100 * high:.1f}%)")
@@ -0,0 +1,97 @@
+import multiprocessing
+import multiprocessing.connection
+
+from z3 import Solver, SolverFor, Then, Z3Exception
+
+# Configurations the portfolio can race: name -> (tactics or None for the plain solver, solver parameters).
+# 'seed:N' stands for the plain solver with random seeds N. 'ematching' is no-mbqi with eager pattern
+# instantiation (a higher eager threshold) and without relevancy filtering, so it instantiates more.
+CONFIGURATIONS = {
+    'mbqi': (None, {'smt.mbqi': True}),
+    'no-mbqi': (None, {'smt.mbqi': False}),
+    'qe-smt': (['qe', 'smt'], {}),
+    'ematching': (None, {'smt.mbqi': False, 'smt.qi.eager_threshold': 100.0, 'smt.relevancy': 0}),
+}
+
+DEFAULT_PORTFOLIO = ['mbqi', 'qe-smt', 'seed:1', 'seed:2']
+
+
+def configuration(name):
+    """
+    (tactics, parameters) of a configuration name of CONFIGURATIONS or 'seed:N'
+    """
+    if name.startswith('seed:'):
+        seed = int(name[len('seed:'):])
+        return None, {'smt.random_seed': seed, 'sat.random_seed': seed}
+    if name not in CONFIGURATIONS:
+        raise ValueError(f"unknown portfolio configuration '{name}' (available: {', '.join(CONFIGURATIONS)}, seed:N)")
+    return CONFIGURATIONS[name]
+
+
+def make_solver(name, logic=None):
+    tactics, parameters = configuration(name)
+    if tactics is not None:
+        solver = Then(*tactics).solver()
+    else:
+        solver = Solver() if logic is None else SolverFor(logic)
+    for key, value in parameters.items():
+        solver.set(key, value)
+    return solver
+
+
+def solve_worker(conn, name, query, logic):
+    """
+    Solve the SMT-LIB `query` under configuration `name` in a child process and send
+    (result, model as a string or None, solver statistics) through `conn`
+    """
+    try:
+        solver = make_solver(name, logic)
+        solver.from_string(query)
+        result = str(solver.check())
+        statistics = solver.statistics()
+        collected = {key: statistics.get_key_value(key) for key in statistics.keys()}
+        conn.send((result, str(solver.model()) if result == 'sat' else None, collected))
+    except (MemoryError, Z3Exception) as e:
+        conn.send(('unknown', f"{type(e).__name__}: {e}", {}))
+    finally:
+        conn.close()
+
+
+def race(query, names, logic=None):
+    """
+    Solve the SMT-LIB `query` under every configuration of `names` in its own process. The first 'sat' or 'unsat'
+    wins and the other processes are killed.
+    Returns (result, winning configuration, model string, solver statistics of the winner);
+    result is 'unknown' (with no winner) if no configuration gives a definitive answer.
+    """
+    running = {}  # receiving end of the pipe -> (configuration, process)
+    for name in names:
+        configuration(name)  # Reject unknown names before starting anything
+    for name in names:
+        receiver, sender = multiprocessing.Pipe(duplex=False)
+        process = multiprocessing.Process(target=solve_worker, args=(sender, name, query, logic))
+        process.start()
+        sender.close()
+        running[receiver] = (name, process)
+
+    outcome = ('unknown', None, None, {})
+    try:
+        while running and outcome[0] == 'unknown':
+            for receiver in multiprocessing.connection.wait(list(running.keys())):
+                name, process = running.pop(receiver)
+                try:
+                    result, model, statistics = receiver.recv()
+                except EOFError:
+                    # The process died without reporting, e.g. crashed when it ran out of memory
+                    result, model, statistics = 'unknown', None, {}
+                receiver.close()
+                process.join()
+                if result in ('sat', 'unsat'):
+                    outcome = (result, name, model, statistics)
+                    break
+    finally:
+        for receiver, (_, process) in running.items():
+            process.kill()
+            process.join()
+            receiver.close()
+    return outcome
@@ -1,8 +1,32 @@
 from channel import *
+from portfolio import race
 
 import sys
+import time
 
 class Connector:
+    # How isRefinementOf solves the exists-forall query: 'mbqi' (one ForAll, Z3's quantifier engines)
+    # 'cegar' (isRefinementOfCegar) or 'lazy' (channels added on demand, isRefinementOfLazy)
+    ENGINE = 'mbqi'
+    # Whether the checks run on connectors simplified by rewrite.normalize_pair
+    REWRITE = True
+    # Whether the checks are split into regions by compose.check_compositional
+    COMPOSITIONAL = False
+    # Logic the solvers of the checks are created for: 'auto' (chosen per check by solverLogic), 'default'
+    # (Z3's own choice) or an SMT-LIB logic name such as 'QF_IDL'
+    LOGIC = 'auto'
+    # Time domain and logic of the last solver created for a check, e.g. 'int time x13, QF_IDL'
+    CONFIGURATION = None
+    # Solver configurations (see portfolio.CONFIGURATIONS) that isRefinementOf races in separate processes,
+    # or None to solve in this process
+    PORTFOLIO = None
+    # Whether checks with probabilistic channels compute the exact probability of refinement (refinementProbability)
+    # instead of checking one random draw
+    EXACT = False
+    # Largest k for which checks first try to prove refinement for every bound by k-induction
+    # (induction.check_inductive), or None to only check the bound
+    INDUCTION = None
+
     def __init__(self):
         self.channels = []
 
@@ -10,94 +34,724 @@ class Connector:
         self.channels += [(channel, nodes)]
         return self
 
-    def isRefinementOf(self, abstraction, bound):
+    def isRefinementOf(self, abstraction, bound, stats=None):
+        # With a CheckStats as `stats`, the time and size of every part of the check are recorded into it.
+        # Returns (refines, counter-example or None, query) where query() gives the SMT-LIB text on demand;
+        # refines is None if the solver gave up.
         assert isinstance(abstraction, Connector)
+        if Connector.ENGINE == 'cegar':
+            return self.isRefinementOfCegar(abstraction, bound, stats=stats)
+        if Connector.ENGINE == 'lazy':
+            return self.isRefinementOfLazy(abstraction, bound, stats)
+
+        solver = self.refinementSolver(abstraction, bound, stats)
+        if Connector.PORTFOLIO:
+            return self.racePortfolio(solver, quantified(self, abstraction), stats)
+        # TODO: time constraints of the nodes in forall should be put into absGlobalConstr
+        # @liyi test if the todo techniques work
+        start = time.perf_counter()
+        result = solver.check()
+        if stats is not None:
+            stats.addTime('solve', time.perf_counter() - start)
+            stats.addSolver(solver)
+
+        # DEBUG USE
+        if 'counterexample' in sys.argv and str(result) == 'sat':
+            print(solver.model())
+
+        # For debugging: if command line arguments include 'smt2', print constraints in SMT-LIB 2 format
+        if 'smt2' in sys.argv:
+            print(solver.to_smt2())
+
+        if str(result) == 'sat':
+            return False, solver.model(), solver.to_smt2
+        if str(result) == 'unsat':
+            return True, None, solver.to_smt2
+        return None, None, solver.to_smt2
+
+    def racePortfolio(self, solver, quantified, stats=None):
+        """
+        Solve the query of `solver` under every configuration of Connector.PORTFOLIO in its own process and take
+        the first definitive answer (see portfolio.race); the winner is added to Connector.CONFIGURATION.
+        Returns the same as isRefinementOf, the counter-example being the printed model, or (None, None, None)
+        if no configuration decides the query.
+        """
+        query = solver.to_smt2()
+        start = time.perf_counter()
+        result, winner, model, statistics = race(query, Connector.PORTFOLIO, solverLogic(quantified))
+        if stats is not None:
+            stats.addTime('solve', time.perf_counter() - start)
+            stats.addStatistics(statistics)
+
+        if result == 'unknown':
+            return None, None, None
+        Connector.CONFIGURATION += f", portfolio {winner}"
+        if 'counterexample' in sys.argv and result == 'sat':
+            print(model)
+        if result == 'sat':
+            return False, model, lambda: query
+        return True, None, lambda: query
+
+    def refinementSolver(self, abstraction, bound, stats=None):
+        """
+        A solver holding the refinement query of isRefinementOf: sat iff this connector does not refine
+        `abstraction` up to `bound`
+        """
+        assert isinstance(abstraction, Connector)
+        useDomains([self, abstraction], bound)
         nodes = {}
 
-        solver = Solver()
+        solver = newSolver(quantified(self, abstraction))
 
         for chan in self.channels:
+            start = time.perf_counter()
             for nd in chan[1]:
                 if nd not in nodes:
-                    nodes[nd] = {
-                        'time': [Real(nd + '_t_' + str(i)) for i in range(bound)],
-                        'data': [Int(nd + '_d_' + str(i)) for i in range(bound)]
-                        }
+                    nodes[nd] = {'time': [], 'data': []}
+                    solver.add(extendNode(nd, nodes[nd], bound))
 
-                    solver.add(nodes[nd]['time'][0] >= 0)
-                    for i in range(bound - 1):
-                        solver.add(nodes[nd]['time'][i] < nodes[nd]['time'][i + 1])
+            allocated = time.perf_counter()
+            paramnodes = list(map(lambda name: nodes[name], chan[1]))
+            constr = encodeChannel(chan[0], paramnodes, bound)
+            solver.add(constr)
+            if stats is not None:
+                stats.addTime('nodes', allocated - start)
+                stats.addChannel(chan[0], time.perf_counter() - allocated, constr)
+
+        start = time.perf_counter()
+        solver.add(abstractionConstraint(abstraction, nodes, bound, stats))
+        if stats is not None:
+            stats.addTime('abstraction', time.perf_counter() - start)
+        return solver
 
-                    for i in range(bound):
-                        solver.add(Or(nodes[nd]['data'][i] < 10, nodes[nd]['data'][i] > 20))
+    def behaviorSolver(self, bound):
+        """
+        A solver holding the constraints of this connector up to `bound`, so that its models are the behaviors
+        of the connector, together with the variables of its nodes: (solver, {node: {'time': [..], 'data': [..]}})
+        """
+        useDomains([self], bound)
+        nodes = {}
+        solver = newSolver(False)
+        for chan in self.channels:
+            for nd in chan[1]:
+                if nd not in nodes:
+                    nodes[nd] = {'time': [], 'data': []}
+                    solver.add(extendNode(nd, nodes[nd], bound))
 
-            channelDecl = eval('Channel.' + chan[0])
             paramnodes = list(map(lambda name: nodes[name], chan[1]))
-            solver.add(channelDecl(paramnodes, bound))
+            solver.add(encodeChannel(chan[0], paramnodes, bound))
+        return solver, nodes
 
-        foralls = []
-        absGlobalConstr = None
-        absTimeConstr = None
+    def isRefinementOfCegar(self, abstraction, bound, max_iterations=1000, stats=None):
+        """
+        Same query as isRefinementOf, solved as a counterexample-guided loop of two quantifier-free solvers
+        instead of one ForAll:
+        - the candidate solver proposes an implementation behavior that no known witness covers,
+        - the verifier looks for values of the abstraction-only nodes under which the abstraction accepts it.
+        No such values means the candidate is a counter-example; otherwise the witness, generalized to terms
+        over the shared nodes where possible, is instantiated into the ForAll and added as a lemma.
+        Returns (None, None, None) if the loop does not settle within max_iterations.
+        """
+        assert isinstance(abstraction, Connector)
+        useDomains([self, abstraction], bound)
+        nodes = {}
+
+        hidden = quantified(self, abstraction)
+        candidates = newSolver(hidden)
 
-        for chan in abstraction.channels:
+        for chan in self.channels:
+            start = time.perf_counter()
             for nd in chan[1]:
                 if nd not in nodes:
-                    nodes[nd] = {
-                        'time': [Const(nd + '_t_' + str(i), RealSort()) for i in range(bound)],
-                        'data': [Const(nd + '_d_' + str(i), IntSort()) for i in range(bound)]
-                        }
+                    nodes[nd] = {'time': [], 'data': []}
+                    candidates.add(extendNode(nd, nodes[nd], bound))
 
-                    foralls += nodes[nd]['time']
-                    foralls += nodes[nd]['data']
+            allocated = time.perf_counter()
+            paramnodes = list(map(lambda name: nodes[name], chan[1]))
+            constr = encodeChannel(chan[0], paramnodes, bound)
+            candidates.add(constr)
+            if stats is not None:
+                stats.addTime('nodes', allocated - start)
+                stats.addChannel(chan[0], time.perf_counter() - allocated, constr)
+
+        start = time.perf_counter()
+        shared = [v for chan in abstraction.channels for nd in chan[1] if nd in nodes
+                  for v in nodes[nd]['time'] + nodes[nd]['data']]
+        shared = list({v.get_id(): v for v in shared}.values())
+        times = {v.get_id() for nd in nodes for v in nodes[nd]['time']}
+        foralls, absTimeConstr, absGlobalConstr = abstractionParts(abstraction, nodes, bound, stats)
+        if absGlobalConstr is None:
+            absGlobalConstr = BoolVal(True)
+        accepted = absGlobalConstr if absTimeConstr is None else And(absTimeConstr, absGlobalConstr)
+
+        verifier = newSolver(hidden)
+        verifier.add(accepted)
+        if stats is not None:
+            stats.addTime('abstraction', time.perf_counter() - start)
+
+        start = time.perf_counter()
+        outcome = None, None, None
+        for iteration in range(max_iterations):
+            result = candidates.check()
+            if str(result) == 'unsat':
+                outcome = True, None, candidates.to_smt2
+                break
+            if str(result) != 'sat':
+                break
+            model = candidates.model()
 
-                    currTimeConstr = (nodes[nd]['time'][0] >= 0)
-                    for i in range(bound - 1):
-                        currTimeConstr = And(currTimeConstr, nodes[nd]['time'][i] < nodes[nd]['time'][i + 1])
+            verifier.push()
+            verifier.add([v == model.eval(v, model_completion=True) for v in shared])
+            result = verifier.check()
+            if str(result) == 'unsat':
+                if 'counterexample' in sys.argv:
+                    print(model)
+                outcome = False, model, candidates.to_smt2
+                break
+            if str(result) != 'sat':
+                verifier.pop()
+                break
+            witness = [(y, verifier.model().eval(y, model_completion=True)) for y in foralls]
+            verifier.pop()
 
-                    currDataConstr = True
-                    for i in range(bound):
-                        currDataConstr = And(currDataConstr, Or(nodes[nd]['data'][i] < 10, nodes[nd]['data'][i] > 20))
+            # The instance must exclude the current candidate, otherwise fall back to the concrete witness
+            if foralls == []:
+                candidates.add(Not(accepted))
+                continue
+            lemma = Not(substitute(accepted, *witnessTerms(witness, model, shared, times)))
+            if not is_false(model.eval(lemma, model_completion=True)):
+                lemma = Not(substitute(accepted, *witness))
+            candidates.add(lemma)
 
-                    currNodeConstr = And(currTimeConstr, currDataConstr)
+        if stats is not None:
+            stats.addTime('solve', time.perf_counter() - start)
+            stats.addSolver(candidates)
+            stats.addSolver(verifier)
+            stats.solver['cegar iterations'] = stats.solver.get('cegar iterations', 0) + iteration + 1
+        return outcome
 
-                    # Merge into the total abstract time constraints (conjunction of multiple nodes' time constraints)
-                    if absTimeConstr is None:
-                        absTimeConstr = currNodeConstr
-                    else:
-                        absTimeConstr = And(absTimeConstr, currNodeConstr)
+    def isRefinementOfLazy(self, abstraction, bound, stats=None):
+        """
+        Same query as isRefinementOf, solved on an over-approximation of this connector: the solver starts with
+        the node constraints and the abstraction only, and every channel of this connector is added back behind
+        an assumption literal once a candidate counter-example violates it. A candidate that satisfies every
+        channel is a counter-example; unsat means refinement holds, and the unsat core over the literals tells
+        which channels the proof depends on. Quantified checks get a fresh solver per candidate over the
+        channels added so far (Z3's incremental core is far slower on them, see session.py), so their proofs
+        are attributed to all the channels added.
+        The number of channels added (for a counter-example) or used by the proof is added to
+        Connector.CONFIGURATION.
+        """
+        assert isinstance(abstraction, Connector)
+        useDomains([self, abstraction], bound)
+        nodes = {}
+        hidden = quantified(self, abstraction)
+        solver = newSolver(hidden)
+        base = []
+        channels = []  # (assumption literal, constraints) of every channel of this connector
 
-            channelDecl = eval('Channel.' + chan[0])
+        for k, chan in enumerate(self.channels):
+            start = time.perf_counter()
+            for nd in chan[1]:
+                if nd not in nodes:
+                    nodes[nd] = {'time': [], 'data': []}
+                    base += extendNode(nd, nodes[nd], bound)
+
+            allocated = time.perf_counter()
             paramnodes = list(map(lambda name: nodes[name], chan[1]))
+            constr = encodeChannel(chan[0], paramnodes, bound)
+            channels += [(Bool('#channel_' + str(k)), constr)]
+            if stats is not None:
+                stats.addTime('nodes', allocated - start)
+                stats.addChannel(chan[0], time.perf_counter() - allocated, constr)
+
+        start = time.perf_counter()
+        base += [abstractionConstraint(abstraction, nodes, bound, stats)]
+        solver.add(base)
+        if stats is not None:
+            stats.addTime('abstraction', time.perf_counter() - start)
 
-            constr = channelDecl(paramnodes, bound)
-            if absGlobalConstr is None:
-                absGlobalConstr = constr
+        start = time.perf_counter()
+        # Start from the channels at the nodes shared with the abstraction: the observable behavior hinges on them
+        shared = {nd for chan in abstraction.channels for nd in chan[1]}
+        active = [k for k, chan in enumerate(self.channels) if any(nd in shared for nd in chan[1])]
+        if not hidden:
+            solver.add([Implies(channels[k][0], channels[k][1]) for k in active])
+        outcome = None, None, None
+        for iteration in range(len(channels) + 1):
+            if hidden:
+                solver = newSolver(True)
+                solver.add(base + [channels[k][1] for k in active])
+                result = solver.check()
             else:
-                absGlobalConstr = And(constr, absGlobalConstr)
+                result = solver.check(*[channels[k][0] for k in active])
+            if str(result) == 'unsat':
+                core = {c.get_id() for c in solver.unsat_core()} if not hidden else None
+                used = active if hidden else [k for k in active if channels[k][0].get_id() in core]
+                Connector.CONFIGURATION += f", lazy {len(used)} of {len(channels)} channels"
+                outcome = True, None, solver.to_smt2
+                break
+            if str(result) != 'sat':
+                break
+            model = solver.model()
 
-        if absTimeConstr is not None:
-            absGlobalConstr = Or(Not(absTimeConstr), Not(absGlobalConstr))
-        else:
-            absGlobalConstr = Not(absGlobalConstr)
+            violated = [k for k in range(len(channels)) if k not in active
+                        and not is_true(model.eval(channels[k][1], model_completion=True))]
+            if violated == []:
+                Connector.CONFIGURATION += f", lazy {len(active)} of {len(channels)} channels"
+                if 'counterexample' in sys.argv:
+                    print(model)
+                outcome = False, model, solver.to_smt2
+                break
+            active += violated
+            if not hidden:
+                solver.add([Implies(channels[k][0], channels[k][1]) for k in violated])
+
+        if stats is not None:
+            stats.addTime('solve', time.perf_counter() - start)
+            stats.addSolver(solver)
+            stats.solver['lazy iterations'] = stats.solver.get('lazy iterations', 0) + iteration + 1
+            stats.solver['lazy channels'] = stats.solver.get('lazy channels', 0) + len(active)
+        return outcome
+
+    def refinementProbability(self, abstraction, bound, stats=None):
+        """
+        Exact probability that this connector refines `abstraction` up to `bound` over the random draws of its
+        probabilistic channels. Every draw is a weighted choice variable (Channel.PROBABILITY 'symbolic'), and the
+        refinement query is sat for a draw iff refinement fails for it, so the probability of failure is the
+        weighted count of the draws projected from the models of the query. The draws are split one choice at a
+        time, and a partial draw (a cube) is settled without splitting further when
+        - the query is unsat under it: refinement holds for all its extensions, or
+        - the implementation behavior of a model is a counter-example for all its extensions.
+        Settled cubes are cached (shrunk to unsat cores where the solver gives them), so partial draws that
+        extend them are settled without calling the solver.
+        Returns (probability as a Fraction, number of choices, number of solver calls),
+        or (None, choices, calls) if the solver gives up.
+        """
+        mode, choices = Channel.PROBABILITY, Channel.CHOICES
+        Channel.PROBABILITY, Channel.CHOICES = 'symbolic', []
+        try:
+            solver = self.refinementSolver(abstraction, bound, stats)
+            weighted = list(Channel.CHOICES)
+        finally:
+            Channel.PROBABILITY, Channel.CHOICES = mode, choices
+
+        hidden = quantified(self, abstraction)
+        query = And(list(solver.assertions()) + [BoolVal(True)])
+        isChoice = {choice.get_id() for choice, _ in weighted}
+        behavior = [v for v in freeConstants([query]) if v.get_id() not in isChoice]
+        weights = {choice.get_id(): Fraction(str(p)) for choice, p in weighted}
+        holding, failing = [], []  # settled cubes, as sets of (choice id, value)
+        calls = [0]
+
+        def weight(cube):
+            mass = Fraction(1)
+            for choice, value in cube:
+                mass *= weights[choice.get_id()] if is_true(value) else 1 - weights[choice.get_id()]
+            return mass
+
+        queries = None if hidden else newSolver(False)
+        if queries is not None:
+            queries.add(query)
+
+        def solve(cube, formula=None):
+            # (result, model, core of the cube) of `formula` (default: the query) under the choice values of `cube`
+            calls[0] += 1
+            if hidden and formula is None:
+                # A fresh solver: Z3's incremental core is far slower on quantified queries (see session.py)
+                fresh = newSolver(True)
+                fresh.add(substitute(query, *cube) if cube else query)
+                result = str(fresh.check())
+                return result, fresh.model() if result == 'sat' else None, cube
+            solver = queries
+            if formula is not None:
+                # Negated, the ForAll of a quantified query is existential
+                solver = newSolver(hidden)
+                solver.add(formula)
+            literals = [choice == value for choice, value in cube]
+            assumptions = {literal.get_id(): pair for literal, pair in zip(literals, cube)}
+            result = str(solver.check(*literals))
+            if result == 'sat':
+                return result, solver.model(), cube
+            if result == 'unsat':
+                return result, None, [assumptions[literal.get_id()] for literal in solver.unsat_core()]
+            return result, None, cube
+
+        def failure(cube):
+            # Probability mass of the extensions of `cube` for which refinement fails, or None if unknown
+            key = {(choice.get_id(), is_true(value)) for choice, value in cube}
+            if any(settled <= key for settled in holding):
+                return Fraction(0)
+            if any(settled <= key for settled in failing):
+                return weight(cube)
+
+            result, model, core = solve(cube)
+            if result == 'unsat':
+                holding.append({(choice.get_id(), is_true(value)) for choice, value in core})
+                return Fraction(0)
+            if result != 'sat':
+                return None
+            if len(cube) == len(weighted):
+                return weight(cube)
+
+            # Does the behavior of the model fail refinement whatever the remaining choices are?
+            fixed = [(v, model.eval(v, model_completion=True)) for v in behavior]
+            result, _, core = solve(cube, Not(substitute(query, *fixed)) if fixed else Not(query))
+            if result == 'unsat':
+                failing.append({(choice.get_id(), is_true(value)) for choice, value in core})
+                return weight(cube)
+
+            assigned = {choice.get_id() for choice, _ in cube}
+            choice = next(choice for choice, _ in weighted if choice.get_id() not in assigned)
+            masses = [failure(cube + [(choice, BoolVal(value))]) for value in [True, False]]
+            return None if None in masses else sum(masses)
+
+        start = time.perf_counter()
+        mass = failure([])
+        if stats is not None:
+            stats.addTime('count', time.perf_counter() - start)
+            stats.solver['count solver calls'] = stats.solver.get('count solver calls', 0) + calls[0]
+        return (None if mass is None else 1 - mass), len(weighted), calls[0]
+
+    def isRefinementUpTo(self, abstraction, max_bound, stats=None):
+        """
+        Check refinement for every bound from 1 to max_bound, reusing the encoding across bounds.
+        Node variables, their constraints and the constraints of prefix-closed channels are built once and kept;
+        only the other channels and the abstraction are re-encoded per bound.
+        If every node of the abstraction is also a node of this connector, the query is quantifier-free and all
+        bounds run on one incremental solver with push/pop. Otherwise Z3 needs its (non-incremental) exists-forall
+        engine, so each bound gets a fresh solver over the constraints kept so far.
+        The cegar and lazy engines and a portfolio (Connector.ENGINE, Connector.PORTFOLIO) keep no encoding across
+        bounds: every bound is checked on its own with isRefinementOf.
+        Returns (True, max_bound, None) if refinement holds up to max_bound,
+        otherwise (False, first failing bound, counter-example), or (None, bound, None) if the solver gave up at bound.
+        """
+        assert isinstance(abstraction, Connector)
+        if Connector.ENGINE != 'mbqi' or Connector.PORTFOLIO:
+            for bound in range(1, max_bound + 1):
+                result, counterexample, _ = self.isRefinementOf(abstraction, bound, stats)
+                if not result:
+                    return result, bound, counterexample
+            return True, max_bound, None
+
+        useDomains([self, abstraction], max_bound)
+        nodes = {}
+        kept = []      # constraints valid for every bound
+        added = set()  # ids of the prefix-closed channel constraints already kept
+
+        incremental = not quantified(self, abstraction)
+        solver = newSolver(not incremental)
+
+        for bound in range(1, max_bound + 1):
+            start = time.perf_counter()
+            new = []
+            for chan in self.channels:
+                for nd in chan[1]:
+                    if nd not in nodes:
+                        nodes[nd] = {'time': [], 'data': []}
+                    if len(nodes[nd]['time']) < bound:
+                        new += extendNode(nd, nodes[nd], bound)
+            if stats is not None:
+                stats.addTime('nodes', time.perf_counter() - start)
+
+            scoped = []
+            for chan in self.channels:
+                start = time.perf_counter()
+                paramnodes = list(map(lambda name: nodes[name], chan[1]))
+                constr = encodeChannel(chan[0], paramnodes, bound)
+                if stats is not None:
+                    stats.addChannel(chan[0], time.perf_counter() - start, constr)
+                if chan[0].split('(')[0] not in Channel.PREFIX_CLOSED:
+                    scoped += [constr]
+                    continue
+                for c in Conjuncts(constr):
+                    if c.get_id() not in added:
+                        added.add(c.get_id())
+                        new += [c]
 
-        if foralls != []:
-            solver.add(ForAll(foralls, absGlobalConstr))
+            kept += new
+            if incremental:
+                solver.add(new)
+                solver.push()
+            else:
+                solver = newSolver(True)
+                solver.add(kept)
+            solver.add(scoped)
+            start = time.perf_counter()
+            solver.add(abstractionConstraint(abstraction, dict(nodes), bound, stats))
+            if stats is not None:
+                stats.addTime('abstraction', time.perf_counter() - start)
+
+            start = time.perf_counter()
+            result = solver.check()
+            if stats is not None:
+                stats.addTime('solve', time.perf_counter() - start)
+                # An incremental solver accumulates its statistics over the bounds
+                if not incremental or str(result) != 'unsat' or bound == max_bound:
+                    stats.addSolver(solver)
+            if str(result) == 'sat':
+                model = solver.model()
+                if 'counterexample' in sys.argv:
+                    print(model)
+                return False, bound, model
+            if str(result) != 'unsat':
+                return None, bound, None
+            if incremental:
+                solver.pop()
+
+        return True, max_bound, None
+
+
+class CheckStats:
+    """
+    Where a refinement check spends its time, filled in by the Connector.isRefinement* methods:
+    - phases: wall time in seconds of 'nodes' (node variables), 'channels' (the connector's channels),
+      'abstraction' (the whole abstraction side, its channels included) and 'solve'
+    - channels: [channel, side, seconds, constraint] for every channel encoding, side being 'connector'
+      or 'abstraction'; the expression DAG sizes are only counted by toDict
+    - solver: Z3's solver statistics, summed over the solvers used (maximum for memory)
+    """
+    def __init__(self):
+        self.phases = {}
+        self.channels = []
+        self.solver = {}
+
+    def addTime(self, phase, seconds):
+        self.phases[phase] = self.phases.get(phase, 0) + seconds
+
+    def addChannel(self, channel, seconds, constraint, abstraction=False):
+        self.channels += [[channel, 'abstraction' if abstraction else 'connector', seconds, constraint]]
+        if not abstraction:
+            self.addTime('channels', seconds)
+
+    def addSolver(self, solver):
+        statistics = solver.statistics()
+        self.addStatistics({key: statistics.get_key_value(key) for key in statistics.keys()})
+
+    def addStatistics(self, statistics):
+        # Add solver statistics given as {key: value}
+        for key, value in statistics.items():
+            if 'memory' in key:
+                self.solver[key] = max(self.solver.get(key, 0), value)
+            else:
+                self.solver[key] = self.solver.get(key, 0) + value
+
+    def toDict(self):
+        return {
+            'phases': dict(self.phases),
+            'channels': [{'channel': channel, 'side': side, 'time': seconds, 'dag_size': dagSize(constraint)}
+                         for channel, side, seconds, constraint in self.channels],
+            'solver': dict(self.solver)
+            }
+
+
+def dagSize(expr):
+    # Number of distinct subterms of a Z3 expression
+    seen = set()
+    stack = [expr]
+    while stack:
+        e = stack.pop()
+        if e.get_id() in seen:
+            continue
+        seen.add(e.get_id())
+        stack += e.children()
+    return len(seen)
+
+
+def extendNode(name, node, bound):
+    """
+    Extend the time/data variables of a node up to `bound` and return the constraints of the new steps:
+    strictly increasing non-negative time stamps and data outside the reserved range (see dataRange).
+    """
+    constraints = []
+    for i in range(len(node['time']), bound):
+        node['time'] += [TimeVar(name + '_t_' + str(i))]
+        node['data'] += [DataVar(name + '_d_' + str(i))]
+
+        if i == 0:
+            constraints += [node['time'][0] >= 0]
         else:
-            solver.add(absGlobalConstr)
-        # TODO: time constraints of the nodes in forall should be put into absGlobalConstr
-        # @liyi test if the todo techniques work
-        result = solver.check()
+            constraints += [node['time'][i - 1] < node['time'][i]]
+        constraints += [dataRange(node['data'][i])]
 
-        # DEBUG USE
-        if 'counterexample' in sys.argv and str(result) == 'sat':
-            print(solver.model())
+    return constraints
 
-        # For debugging: if command line arguments include 'smt2', print constraints in SMT-LIB 2 format
-        if 'smt2' in sys.argv:
-            print(solver.to_smt2())
 
-        if str(result) == 'sat':
-            return False, solver.model(), solver.to_smt2()
+def abstractionConstraint(abstraction, nodes, bound, stats=None):
+    """
+    Encode the refinement obligation of `abstraction`: for every assignment of the nodes only the abstraction
+    uses, either their time/data constraints or the abstraction's channels are violated.
+    Nodes not in `nodes` yet are added to it.
+    """
+    foralls, absTimeConstr, absGlobalConstr = abstractionParts(abstraction, nodes, bound, stats)
+    if absGlobalConstr is None:
+        # An abstraction without channels accepts every behavior
+        absGlobalConstr = BoolVal(True)
+
+    if absTimeConstr is not None:
+        absGlobalConstr = Or(Not(absTimeConstr), Not(absGlobalConstr))
+    else:
+        absGlobalConstr = Not(absGlobalConstr)
+
+    if foralls != []:
+        return ForAll(foralls, absGlobalConstr)
+    return absGlobalConstr
+
+
+def abstractionParts(abstraction, nodes, bound, stats=None):
+    """
+    Encode `abstraction` over `nodes` (adding the nodes only the abstraction uses) and return
+    (variables of the abstraction-only nodes, their time/data constraints or None, the channel constraints)
+    """
+    foralls = []
+    absGlobalConstr = []
+    absTimeConstr = []
+
+    for chan in abstraction.channels:
+        for nd in chan[1]:
+            if nd not in nodes:
+                nodes[nd] = {
+                    'time': [Const(nd + '_t_' + str(i), RealSort()) for i in range(bound)],
+                    'data': [DataVar(nd + '_d_' + str(i)) for i in range(bound)]
+                    }
+
+                foralls += nodes[nd]['time']
+                foralls += nodes[nd]['data']
+
+                # Collect into the total abstract time constraints (conjunction of multiple nodes' time constraints)
+                absTimeConstr += [nodes[nd]['time'][0] >= 0]
+                for i in range(bound - 1):
+                    absTimeConstr += [nodes[nd]['time'][i] < nodes[nd]['time'][i + 1]]
+
+                for i in range(bound):
+                    absTimeConstr += [dataRange(nodes[nd]['data'][i])]
+
+        start = time.perf_counter()
+        paramnodes = list(map(lambda name: nodes[name], chan[1]))
+
+        constr = encodeChannel(chan[0], paramnodes, bound)
+        if stats is not None:
+            stats.addChannel(chan[0], time.perf_counter() - start, constr, abstraction=True)
+        absGlobalConstr += [constr]
+
+    absTimeConstr = None if absTimeConstr == [] else Conjunction(absTimeConstr)
+    absGlobalConstr = None if absGlobalConstr == [] else Conjunction(absGlobalConstr)
+    return foralls, absTimeConstr, absGlobalConstr
+
+
+def witnessTerms(witness, model, shared, times):
+    """
+    Generalize the values the verifier found for the abstraction-only variables into terms over the shared
+    variables, keeping the order of all time stamps: a value equal to a shared variable becomes that variable,
+    the k-th of r distinct time stamps between two consecutive shared time stamps lo < hi becomes
+    lo + (hi - lo) * k / (r + 1), time stamps outside all shared ones are placed 1 apart.
+    Other values stay constants. `times` are the ids of the time variables; shared time stamps of the integer
+    time domain are converted to reals.
+    """
+    def value(v):
+        return model.eval(v, model_completion=True)
+
+    def number(val):
+        return Fraction(str(val))
+
+    values = {}
+    for v in sorted(shared, key=str):
+        values.setdefault((str(value(v)), v.sort()), v)
+
+    anchors = sorted({number(value(v)): ToReal(v) if is_int(v) else v for v in shared if v.get_id() in times}.items())
+    stamps = sorted({number(val) for var, val in witness if is_real(var)})
+
+    terms = []
+    for var, val in witness:
+        if (str(val), var.sort()) in values:
+            terms += [(var, values[(str(val), var.sort())])]
+        elif is_real(var) and anchors != []:
+            x = number(val)
+            lower = [(y, v) for y, v in anchors if y <= x]
+            upper = [(y, v) for y, v in anchors if y > x]
+            if lower != [] and lower[-1][0] == x:
+                terms += [(var, lower[-1][1])]
+                continue
+            between = [y for y in stamps if (lower == [] or y > lower[-1][0]) and (upper == [] or y < upper[0][0])]
+            k = between.index(x) + 1
+            if lower != [] and upper != []:
+                terms += [(var, lower[-1][1] + (upper[0][1] - lower[-1][1]) * k / (len(between) + 1))]
+            elif lower != []:
+                terms += [(var, lower[-1][1] + k)]
+            else:
+                terms += [(var, upper[0][1] - (len(between) + 1 - k))]
         else:
-            return True, None, solver.to_smt2()
-        pass
+            terms += [(var, val)]
+    return terms
+
+
+def freeConstants(terms):
+    # The uninterpreted constants that occur free in `terms`, in order of first occurrence
+    constants = {}
+    seen = set()
+    pending = list(reversed(terms))
+    while pending:
+        term = pending.pop()
+        if term.get_id() in seen:
+            continue
+        seen.add(term.get_id())
+        if is_quantifier(term):
+            pending.append(term.body())
+        elif is_const(term) and term.decl().kind() == Z3_OP_UNINTERPRETED:
+            constants.setdefault(term.get_id(), term)
+        elif is_app(term):
+            pending.extend(reversed(term.children()))
+    return list(constants.values())
+
+
+def quantified(connector, abstraction):
+    # Whether the abstraction has nodes the connector does not use: the ForAll variables of the check, whose
+    # time stamps are always real
+    ownNodes = {nd for chan in connector.channels for nd in chan[1]}
+    return not all(nd in ownNodes for chan in abstraction.channels for nd in chan[1])
+
+
+def solverLogic(quantified):
+    """
+    The logic to create the solvers of a check for, or None for Z3's default: with Connector.LOGIC 'auto',
+    quantifier-free checks over integer time and data are pure difference logic (every atom compares two
+    variables, or a variable and a constant, up to a constant offset) and get QF_IDL
+    """
+    if Connector.LOGIC == 'default':
+        return None
+    if Connector.LOGIC != 'auto':
+        return Connector.LOGIC
+    if not quantified and Channel.TIME_DOMAIN == 'int' and Channel.DATA_DOMAIN == 'int':
+        return 'QF_IDL'
+    return None
+
+
+def newSolver(quantified):
+    # A solver for a check whose abstraction has ForAll variables if `quantified`, recorded in Connector.CONFIGURATION
+    logic = solverLogic(quantified)
+    domain = 'real time' if Channel.TIME_DOMAIN == 'real' else f"int time x{Channel.TIME_SCALE}"
+    Connector.CONFIGURATION = f"{domain}, {'default logic' if logic is None else logic}"
+    return Solver() if logic is None else SolverFor(logic)
+
+
+def getSettings():
+    """
+    The global encoding/solving switches, e.g. to hand them to a worker process or to key the cache
+    """
+    return {'merger': Channel.MERGER_ENCODING, 'engine': Connector.ENGINE, 'rewrite': Connector.REWRITE,
+            'compositional': Connector.COMPOSITIONAL, 'data': Channel.DATA_DOMAIN, 'time': Channel.TIME_DOMAIN,
+            'logic': Connector.LOGIC, 'portfolio': Connector.PORTFOLIO, 'exact': Connector.EXACT,
+            'induction': Connector.INDUCTION}
+
+
+def applySettings(settings):
+    Channel.MERGER_ENCODING = settings['merger']
+    Connector.ENGINE = settings['engine']
+    Connector.REWRITE = settings['rewrite']
+    Connector.COMPOSITIONAL = settings['compositional']
+    Channel.DATA_DOMAIN = settings['data']
+    Channel.TIME_DOMAIN = settings['time']
+    Connector.LOGIC = settings['logic']
+    Connector.PORTFOLIO = settings['portfolio']
+    Connector.EXACT = settings['exact']
+    Connector.INDUCTION = settings['induction']
@@ -0,0 +1,135 @@
+from reo import Connector
+from graph import ConnectorGraph
+
+# Channels that accept any behavior of one end given a behavior of the other, by the positions of the ends that
+# may be left dangling: such a channel is dropped together with the end if no other channel uses it and it is
+# not observable. (The input of a Fifo1 cannot dangle: it must fire before the output, so output times > 0.)
+TOTAL = {'Sync': (0, 1), 'SyncDrain': (0, 1), 'Fifo1': (1,), 'LossySync': (0, 1)}
+
+
+def base_name(channel):
+    return channel.split('(')[0]
+
+
+def collapse_syncs(channels, boundary):
+    """
+    Merge the nodes joined by Sync channels: every internal node is renamed to a representative of its
+    Sync-connected component (a boundary node if there is one). Boundary nodes are never renamed; if a
+    component has several, they stay joined by Syncs to the first one.
+    """
+    parent = {}
+
+    def find(nd):
+        parent.setdefault(nd, nd)
+        while parent[nd] != nd:
+            parent[nd] = parent[parent[nd]]
+            nd = parent[nd]
+        return nd
+
+    order = []
+    for chan, nodes in channels:
+        for nd in nodes:
+            if nd not in parent:
+                order.append(nd)
+                find(nd)
+        if chan == 'Sync':
+            parent[find(nodes[1])] = find(nodes[0])
+
+    members = {}
+    for nd in order:
+        members.setdefault(find(nd), []).append(nd)
+
+    rename = {}
+    result = []
+    for group in members.values():
+        observable = [nd for nd in group if nd in boundary]
+        representative = observable[0] if observable != [] else group[0]
+        for nd in group:
+            rename[nd] = representative
+        for nd in observable[1:]:
+            result.append(('Sync', (representative, nd)))
+
+    for chan, nodes in channels:
+        if chan == 'Sync':
+            continue
+        renamed = tuple(nd if nd in boundary else rename[nd] for nd in nodes)
+        result.append((chan, renamed))
+    return result
+
+
+def drop_redundant_drains(channels):
+    """
+    Drop SyncDrains whose ends are the same node, or that repeat a SyncDrain or Sync between the same pair
+    """
+    result = []
+    seen = set()
+    for chan, nodes in channels:
+        if chan in ('Sync', 'SyncDrain'):
+            pair = frozenset(nodes)
+            if len(pair) == 1 or (chan == 'SyncDrain' and (('Sync', pair) in seen or ('SyncDrain', pair) in seen)):
+                continue
+            seen.add((chan, pair))
+        result.append((chan, nodes))
+    # A Sync that comes after a SyncDrain between the same pair also makes the SyncDrain redundant
+    return [(chan, nodes) for chan, nodes in result
+            if chan != 'SyncDrain' or ('Sync', frozenset(nodes)) not in seen]
+
+
+def drop_unobservable(channels, boundary):
+    """
+    Repeatedly drop TOTAL channels with a dangling end that is internal and used by no other channel
+    (normalize keeps every boundary node declared afterwards)
+    """
+    graph = ConnectorGraph(channels)
+    # Ends per node, so a channel from a node to itself is not mistaken for a dangling end
+    uses = {nd: sum(graph.channels[k][1].count(nd) for k in indices) for nd, indices in graph.uses.items()}
+    dropped = set()
+
+    def droppable(k):
+        chan, nodes = graph.channels[k]
+        ends = [nodes[p] for p in TOTAL.get(base_name(chan), ())]
+        return any(nd not in boundary and uses[nd] == 1 for nd in ends)
+
+    pending = list(range(len(graph.channels)))
+    while pending:
+        k = pending.pop()
+        if k in dropped or not droppable(k):
+            continue
+        dropped.add(k)
+        # Dropping a channel can leave its other ends dangling
+        for nd in graph.channels[k][1]:
+            uses[nd] -= 1
+            pending += [other for other in graph.uses[nd] if other not in dropped]
+    return [graph.channels[k] for k in range(len(graph.channels)) if k not in dropped]
+
+
+def normalize(connector, boundary):
+    """
+    Rewrite a connector (as returned by automerger.define_connector) into a smaller one with the same
+    behavior on the `boundary` nodes: collapse Sync chains, drop redundant SyncDrains and drop channels
+    that only lead to unobservable internal nodes.
+    """
+    channels = [(chan, tuple(nodes)) for chan, nodes in connector.channels]
+    channels = collapse_syncs(channels, boundary)
+    channels = drop_redundant_drains(channels)
+    channels = drop_unobservable(channels, boundary)
+
+    # A boundary node must stay a node of the connector even if none of its channels are left, otherwise it
+    # would turn into an abstraction-only (quantified) node; a Sync from the node to itself only declares it
+    present = {nd for _, nodes in channels for nd in nodes}
+    for nd in sorted(boundary - present):
+        channels.append(('Sync', (nd, nd)))
+
+    result = Connector()
+    for chan, nodes in channels:
+        result.connect(chan, *nodes)
+    return result
+
+
+def normalize_pair(source_conn, target_conn):
+    """
+    Normalize both sides of a refinement check; the nodes they share are the observable ones
+    """
+    boundary = {nd for _, nodes in source_conn.channels for nd in nodes} & \
+               {nd for _, nodes in target_conn.channels for nd in nodes}
+    return normalize(source_conn, boundary), normalize(target_conn, boundary)
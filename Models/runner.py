@@ -0,0 +1,330 @@
+import json
+import multiprocessing
+import multiprocessing.connection
+import os
+import resource
+import signal
+import time
+from collections import Counter
+from fractions import Fraction
+
+from z3 import Z3Exception
+
+from automerger import define_connector
+from cache import ResultCache
+from compose import check_compositional
+from reo import Channel, Connector, CheckStats, getSettings, applySettings, quantified, solverLogic
+from rewrite import normalize_pair
+from graph import reduce_pair
+from induction import check_inductive
+
+# Both refinement directions of an experiment, in the order they are reported
+DIRECTIONS = [("Impl", "Spec"), ("Spec", "Impl")]
+
+# Prefix of the comment line that describes a query written by emit_check
+HEADER = "; refinement check "
+
+
+def prepare_pair(source_conn, target_conn, bound, max_bound=None):
+    # Simplify both connectors of a check unless Connector.REWRITE is off
+    if Connector.REWRITE:
+        source_conn, target_conn = normalize_pair(source_conn, target_conn)
+        bounds = [bound] if max_bound is None else range(1, max_bound + 1)
+        source_conn, target_conn = reduce_pair(source_conn, target_conn, bounds)
+    return source_conn, target_conn
+
+
+def run_check(source_conn, target_conn, bound, max_bound=None, cache=None, stats=False, session=None):
+    """
+    Check source <= target at `bound` (or for every bound up to `max_bound`) and return the outcome:
+    {'status': 'true' / 'false', 'bound': ..., 'counterexample': str or None}.
+    With a ResultCache, a cached verdict is returned without calling the solver (marked 'cached').
+    Unless Connector.REWRITE is off, both connectors are simplified by rewrite.normalize_pair and reduced to the
+    cone of influence of their shared nodes (graph.reduce_pair) first.
+    With Connector.COMPOSITIONAL, the check runs region by region and the outcome also has
+    'regions': [regions checked, regions].
+    With `stats`, the solver always runs (the cache is only written) and the outcome has 'stats' (CheckStats.toDict).
+    With a session.RefinementSession at `bound`, single-bound checks of the mbqi engine without a portfolio run
+    on its shared encodings.
+    Outcomes of the solver have 'configuration': the time domain and logic of the check (Connector.CONFIGURATION).
+    With Connector.EXACT, a single-bound check with probabilistic channels has the outcome
+    {'status': 'probability', 'probability': 'p/q', 'choices': ..} (see Connector.refinementProbability).
+    With Connector.INDUCTION, the check is first tried for every bound by induction.check_inductive on the
+    normalized connectors: a proof gives {'status': 'true', 'bound': None, 'induction': k, ..}; otherwise the
+    bounded check runs and its outcome has 'induction': why induction did not conclude.
+    """
+    key = None if cache is None else cache.key(source_conn, target_conn, bound, max_bound)
+    if key is not None and not stats:
+        outcome = cache.get(key)
+        if outcome is not None:
+            return dict(outcome, cached=True)
+
+    collected = CheckStats() if stats else None
+    Connector.CONFIGURATION = None
+    fallback = None
+    if Connector.INDUCTION:
+        # The cone-of-influence reduction of prepare_pair only holds for the bounds it was checked at
+        normalized = normalize_pair(source_conn, target_conn) if Connector.REWRITE else (source_conn, target_conn)
+        result, depth, _, fallback = check_inductive(*normalized, Connector.INDUCTION, collected)
+        if result:
+            outcome = {'status': 'true', 'bound': None, 'counterexample': None, 'induction': depth,
+                       'configuration': Connector.CONFIGURATION}
+            if key is not None:
+                cache.put(key, outcome)
+            if stats:
+                outcome['stats'] = collected.toDict()
+            return outcome
+        if result is not None:
+            fallback = f"fails at bound {depth}"
+
+    source_conn, target_conn = prepare_pair(source_conn, target_conn, bound, max_bound)
+
+    regions = None
+    Connector.CONFIGURATION = None
+    if Connector.EXACT and max_bound is None and \
+            any(chan.split('(')[0] in Channel.RANDOMIZED for conn in [source_conn, target_conn] for chan, _ in conn.channels):
+        probability, choices, _ = source_conn.refinementProbability(target_conn, bound, collected)
+        if probability is None:
+            outcome = {'status': 'unknown', 'reason': "the solver gave up", 'configuration': Connector.CONFIGURATION}
+        else:
+            outcome = {'status': 'probability', 'probability': str(probability), 'bound': bound, 'choices': choices,
+                       'configuration': Connector.CONFIGURATION}
+            if key is not None:
+                cache.put(key, outcome)
+        if stats:
+            outcome['stats'] = collected.toDict()
+        return outcome
+    if Connector.COMPOSITIONAL:
+        result, depth, counterexample, regions = check_compositional(source_conn, target_conn, bound, max_bound, collected)
+    elif max_bound is None and session is not None and Connector.ENGINE == 'mbqi' and not Connector.PORTFOLIO:
+        result, counterexample, _ = session.check(source_conn, target_conn, collected)
+        depth = bound
+    elif max_bound is None:
+        result, counterexample, _ = source_conn.isRefinementOf(target_conn, bound, collected)
+        depth = bound
+    else:
+        result, depth, counterexample = source_conn.isRefinementUpTo(target_conn, max_bound, collected)
+
+    if result is None:
+        outcome = {'status': 'unknown', 'reason': "the solver gave up", 'configuration': Connector.CONFIGURATION}
+        if stats:
+            outcome['stats'] = collected.toDict()
+        return outcome
+
+    outcome = {
+        'status': 'true' if result else 'false',
+        'bound': depth,
+        'counterexample': None if counterexample is None else str(counterexample),
+        'configuration': Connector.CONFIGURATION
+        }
+    if regions is not None:
+        outcome['regions'] = list(regions)
+    if fallback is not None:
+        outcome['induction'] = fallback
+    if key is not None:
+        cache.put(key, outcome)
+    if stats:
+        outcome['stats'] = collected.toDict()
+    return outcome
+
+
+def emit_check(source_conn, target_conn, bound, path, header):
+    """
+    Write the query of source <= target at `bound` (as run_check would solve it with the mbqi engine) to the
+    SMT-LIB file `path`, for batch.py to solve. `header` ({'case': .., 'source': .., 'target': ..}) is recorded
+    in a comment on the first line, together with the bound and the configuration.
+    """
+    source_conn, target_conn = prepare_pair(source_conn, target_conn, bound)
+    solver = source_conn.refinementSolver(target_conn, bound)
+    logic = solverLogic(quantified(source_conn, target_conn))
+    header = dict(header, bound=bound, configuration=Connector.CONFIGURATION)
+    with open(path, 'w') as f:
+        f.write(HEADER + json.dumps(header) + "\n")
+        if logic is not None:
+            f.write(f"(set-logic {logic})\n")
+        f.write(solver.to_smt2())
+        f.write("(get-model)\n")
+
+
+def check_worker(conn, case_data, direction, bound, max_bound, settings, memory, cache, stats=False):
+    """
+    Run one refinement check in a child process and send the outcome through `conn`.
+    `memory` (in MB) caps the address space of the process, so Z3 fails to allocate instead of swapping.
+    The process leads its own process group, so that a timeout also stops the solvers of a portfolio it started.
+    """
+    os.setpgid(0, 0)
+    if memory is not None:
+        limit = memory * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    applySettings(settings)
+    if cache is not None:
+        # One database connection per process
+        cache = ResultCache(cache.path, cache.max_size)
+
+    try:
+        spec_list, impl_list = case_data
+        connectors = {"Spec": define_connector(spec_list)[0], "Impl": define_connector(impl_list)[0]}
+        source, target = connectors[direction[0]], connectors[direction[1]]
+        conn.send(run_check(source, target, bound, max_bound, cache, stats))
+    except (MemoryError, Z3Exception) as e:
+        conn.send({'status': 'unknown', 'reason': f"{type(e).__name__}: {e}"})
+    finally:
+        conn.close()
+
+
+def kill_group(process):
+    # Kill a check_worker process together with the processes it started
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        # The process has not made its group yet
+        process.kill()
+
+
+def check_label(source_name, target_name, max_bound=None):
+    bounds = "" if max_bound is None else f" (bounds 1..{max_bound})"
+    return f"  Checking: {source_name} <= {target_name}{bounds} ..."
+
+
+def print_verdict(outcome, max_bound=None):
+    """
+    Print the outcome of a check after its check_label
+    """
+    cached = " (cached)" if outcome.get('cached') else ""
+    if outcome.get('configuration'):
+        cached = f" [{outcome['configuration']}]" + cached
+    if 'regions' in outcome:
+        cached = f" ({outcome['regions'][0]} of {outcome['regions'][1]} regions checked)" + cached
+    if isinstance(outcome.get('induction'), str):
+        cached = f" (no induction proof: {outcome['induction']})" + cached
+    if outcome['status'] == 'true' and outcome['bound'] is None:
+        print("\033[92m[TRUE]\033[0m for every bound" + cached) # Green -> TRUE, by induction
+    elif outcome['status'] == 'true':
+        print("\033[92m[TRUE]\033[0m" + ("" if max_bound is None else f" holds up to bound {outcome['bound']}") + cached) # Green -> TRUE
+    elif outcome['status'] == 'false':
+        print("\033[91m[FALSE]\033[0m" + ("" if max_bound is None else f" first fails at bound {outcome['bound']}") + cached) # Red -> FALSE
+        if outcome['counterexample']:
+            print(f"    Counter-example found:\n{outcome['counterexample']}")
+        else:
+            print(f"    (Counter-example found by Z3)")
+    elif outcome['status'] == 'probability':
+        probability = Fraction(outcome['probability'])
+        print(f"\033[96m[P = {probability}]\033[0m ({100 * float(probability):.2f}% of the draws of "
+              f"{outcome['choices']} random choices refine)" + cached) # Cyan -> probability
+    else:
+        print(f"\033[93m[UNKNOWN]\033[0m ({outcome['reason']})" + cached) # Yellow -> UNKNOWN
+    if 'stats' in outcome:
+        phases = outcome['stats']['phases']
+        print("    " + ", ".join(f"{phase} {seconds:.3f}s" for phase, seconds in phases.items()))
+
+
+def print_experiment(case_name, outcomes, max_bound=None):
+    print(f"\n{'='*60}")
+    print(f"Running Experiment: {case_name}")
+    print(f"{'='*60}")
+    for source_name, target_name in DIRECTIONS:
+        print(check_label(source_name, target_name, max_bound), end=" ")
+        print_verdict(outcomes[(source_name, target_name)], max_bound)
+    print("")
+
+
+def run_parallel(cases, jobs, bound, max_bound=None, timeout=None, memory=None, cache=None, stats=False):
+    """
+    Run every (case, direction) check of `cases` (name -> (spec, impl)) in a pool of `jobs` processes.
+    A check that exceeds `timeout` seconds is killed and reported as unknown; the other checks go on.
+    Experiments are printed in sorted order as soon as both of their directions are done.
+    Verdicts are looked up in / stored to `cache` (a ResultCache) if one is given.
+    With `stats`, every outcome carries the statistics of its check (see run_check).
+    Returns {case name: {direction: outcome}}.
+    """
+    settings = getSettings()
+    names = sorted(cases.keys())
+    pending = [(name, direction) for name in names for direction in DIRECTIONS]
+    running = {}  # receiving end of the pipe -> (task, process, deadline)
+    results = {name: {} for name in names}
+    printed = 0
+
+    def finish(task, outcome):
+        nonlocal printed
+        results[task[0]][task[1]] = outcome
+        # Print every experiment that is complete and only preceded by printed ones
+        while printed < len(names) and len(results[names[printed]]) == len(DIRECTIONS):
+            print_experiment(names[printed], results[names[printed]], max_bound)
+            printed += 1
+
+    while pending or running:
+        while pending and len(running) < jobs:
+            task = pending.pop(0)
+            receiver, sender = multiprocessing.Pipe(duplex=False)
+            process = multiprocessing.Process(target=check_worker,
+                                              args=(sender, cases[task[0]], task[1], bound, max_bound, settings, memory, cache, stats))
+            process.start()
+            sender.close()
+            deadline = None if timeout is None else time.monotonic() + timeout
+            running[receiver] = (task, process, deadline)
+
+        deadlines = [deadline for _, _, deadline in running.values() if deadline is not None]
+        wait_time = None if deadlines == [] else max(0, min(deadlines) - time.monotonic())
+        ready = multiprocessing.connection.wait(list(running.keys()), wait_time)
+
+        for receiver in ready:
+            task, process, _ = running.pop(receiver)
+            try:
+                outcome = receiver.recv()
+                process.join()
+            except EOFError:
+                # The process died without reporting, e.g. crashed when it ran out of memory
+                process.join()
+                outcome = {'status': 'unknown', 'reason': f"worker exited with code {process.exitcode}"}
+            receiver.close()
+            finish(task, outcome)
+
+        now = time.monotonic()
+        for receiver, (task, process, deadline) in list(running.items()):
+            if deadline is not None and now >= deadline:
+                kill_group(process)
+                process.join()
+                receiver.close()
+                del running[receiver]
+                finish(task, {'status': 'unknown', 'reason': f"timeout after {timeout}s"})
+
+    return results
+
+
+def aggregate_stats(outcomes):
+    """
+    Sum the statistics of the outcomes that have them: time per phase, time and DAG size per channel type and
+    side, and the solver statistics (maximum for memory)
+    """
+    summary = {'checks': 0, 'phases': Counter(), 'channels': {}, 'solver': {}}
+    for outcome in outcomes:
+        if 'stats' not in outcome:
+            continue
+        stats = outcome['stats']
+        summary['checks'] += 1
+        summary['phases'].update(stats['phases'])
+        for entry in stats['channels']:
+            total = summary['channels'].setdefault((entry['channel'], entry['side']), Counter())
+            total.update({'count': 1, 'time': entry['time'], 'dag_size': entry['dag_size']})
+        for key, value in stats['solver'].items():
+            if 'memory' in key:
+                summary['solver'][key] = max(summary['solver'].get(key, 0), value)
+            else:
+                summary['solver'][key] = summary['solver'].get(key, 0) + value
+    return summary
+
+
+def print_stats(summary):
+    print(f"{'='*60}")
+    print(f"Statistics of {summary['checks']} checks")
+    print(f"{'='*60}")
+    total = sum(summary['phases'].values())
+    for phase, seconds in summary['phases'].most_common():
+        print(f"  {phase:12} {seconds:10.3f}s  {100 * seconds / total if total else 0:5.1f}%")
+    print(f"\n  {'channel':16} {'side':12} {'count':>6} {'time':>10} {'DAG size':>10}")
+    for (channel, side), total in sorted(summary['channels'].items(), key=lambda item: -item[1]['time']):
+        print(f"  {channel:16} {side:12} {total['count']:6} {total['time']:9.3f}s {total['dag_size']:10}")
+    print("\n  solver:")
+    for key, value in sorted(summary['solver'].items()):
+        print(f"  {key:30} {value:>14}")
+    print("")
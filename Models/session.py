@@ -0,0 +1,130 @@
+import time
+
+from z3 import Bool, BoolVal, Implies
+
+from channel import Channel, Conjunction, encodeChannel, useDomains
+from reo import Connector, abstractionConstraint, extendNode, newSolver, quantified
+
+
+class RefinementSession:
+    """
+    Refinement checks at one bound that share their encodings. Every connector is encoded once, and so is the
+    abstraction side of every connector against the nodes it shares with a refining connector, so both
+    directions of an experiment, and every case that reuses a connector verbatim, encode it only once.
+    Nodes of the same name are the same variables in every connector, as in a single check.
+    Quantifier-free checks run on one incremental solver, where every encoding is guarded by an assumption
+    literal and a check source <= target is solver.check(literal of source, literal of target against source).
+    Checks with a ForAll get a fresh solver over the cached encodings instead: Z3's incremental core lacks the
+    preprocessing its non-incremental solver applies to quantified queries, and is orders of magnitude slower
+    on some of them (e.g. test_basic_08).
+    """
+    def __init__(self, bound, connectors=()):
+        """
+        `connectors` are the connectors the session will check (or supersets of them, e.g. before rewriting):
+        the data and time domains of all checks are fixed from them up front
+        """
+        self.bound = bound
+        everything = Connector()
+        for connector in connectors:
+            everything.channels += connector.channels
+        useDomains([everything], bound)
+        self.domains = (Channel.DATA_SORT, Channel.TIME_SORT, Channel.TIME_SCALE)
+        self.solver = newSolver(False)
+        self.configuration = Connector.CONFIGURATION
+        self.nodes = {}            # name -> {'time': [..], 'data': [..]}
+        self.nodeConstraints = {}  # name -> time/data constraints of the node (reo.extendNode)
+        self.encodings = {}        # encoding key -> constraint
+        self.literals = {}         # encoding key -> assumption literal on self.solver
+
+    def useDomains(self):
+        # Other checks (e.g. the satisfiability checks of graph.reduce_pair) may have changed the domains meanwhile
+        Channel.DATA_SORT, Channel.TIME_SORT, Channel.TIME_SCALE = self.domains
+
+    def node(self, name):
+        if name not in self.nodes:
+            self.nodes[name] = {'time': [], 'data': []}
+            self.nodeConstraints[name] = extendNode(name, self.nodes[name], self.bound)
+        return self.nodes[name]
+
+    def connectorKey(self, connector, stats=None):
+        # Encode the constraints of `connector` and its nodes once; returns their key in self.encodings
+        key = ('connector', tuple(connector.channels))
+        if key in self.encodings:
+            return key
+        constraints = []
+        for chan, names in connector.channels:
+            start = time.perf_counter()
+            paramnodes = [self.node(nd) for nd in names]
+            allocated = time.perf_counter()
+            constr = encodeChannel(chan, paramnodes, self.bound)
+            constraints += [constr]
+            if stats is not None:
+                stats.addTime('nodes', allocated - start)
+                stats.addChannel(chan, time.perf_counter() - allocated, constr)
+        # A node that another connector used first still gets its constraints here
+        for nd in sorted({nd for _, names in connector.channels for nd in names}):
+            constraints += self.nodeConstraints[nd]
+        self.encodings[key] = Conjunction(constraints + [BoolVal(True)])
+        return key
+
+    def abstractionKey(self, abstraction, connector, stats=None):
+        # Encode the refinement obligation of `abstraction` for `connector` once; returns its key in self.encodings
+        shared = {nd for _, names in connector.channels for nd in names}
+        own = {nd for _, names in abstraction.channels for nd in names}
+        key = ('abstraction', tuple(abstraction.channels), frozenset(own - shared))
+        if key in self.encodings:
+            return key
+        start = time.perf_counter()
+        self.encodings[key] = abstractionConstraint(abstraction, {nd: self.node(nd) for nd in own & shared},
+                                                    self.bound, stats)
+        if stats is not None:
+            stats.addTime('abstraction', time.perf_counter() - start)
+        return key
+
+    def literal(self, key):
+        # The assumption literal guarding the encoding of `key` on the incremental solver
+        if key not in self.literals:
+            self.literals[key] = Bool('#session_' + str(len(self.literals)))
+            self.solver.add(Implies(self.literals[key], self.encodings[key]))
+        return self.literals[key]
+
+    def check(self, source, target, stats=None):
+        """
+        Same as source.isRefinementOf(target, bound, stats), except that the counter-example is the printed
+        model restricted to the variables of source
+        """
+        self.useDomains()
+        keys = [self.connectorKey(source, stats), self.abstractionKey(target, source, stats)]
+
+        start = time.perf_counter()
+        if quantified(source, target):
+            solver = newSolver(True)
+            solver.add([self.encodings[key] for key in keys])
+            result = str(solver.check())
+            if stats is not None:
+                stats.addTime('solve', time.perf_counter() - start)
+                stats.addSolver(solver)
+        else:
+            solver = self.solver
+            Connector.CONFIGURATION = self.configuration
+            before = self.statistics()
+            result = str(solver.check(*[self.literal(key) for key in keys]))
+            if stats is not None:
+                stats.addTime('solve', time.perf_counter() - start)
+                # The incremental solver accumulates its statistics over the checks
+                stats.addStatistics({key: value if 'memory' in key else value - before.get(key, 0)
+                                     for key, value in self.statistics().items()})
+
+        if result == 'sat':
+            model = solver.model()
+            names = {nd for _, nodes in source.channels for nd in nodes}
+            values = [(v, model.eval(v, model_completion=True)) for nd in sorted(names)
+                      for v in self.nodes[nd]['time'] + self.nodes[nd]['data']]
+            return False, "[" + ",\n ".join(f"{v} = {value}" for v, value in values) + "]", None
+        if result == 'unsat':
+            return True, None, None
+        return None, None, None
+
+    def statistics(self):
+        statistics = self.solver.statistics()
+        return {key: statistics.get_key_value(key) for key in statistics.keys()}
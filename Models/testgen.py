@@ -0,0 +1,153 @@
+import argparse
+import json
+import sys
+from fractions import Fraction
+from itertools import combinations
+
+from z3 import And, Not, is_bv_value
+
+from channel import Channel, DataVar, TimeVar
+
+from automerger import define_connector
+from corpus import open_corpus
+from graph import ConnectorGraph
+
+# Coverage goals: two generated traces differ in at least one selected goal
+#   data:         the data sequence of some boundary node
+#   interleaving: the relative order of the events of the boundary nodes
+#   trace:        some time stamp or data value of the boundary nodes
+COVERAGE = ['data', 'interleaving', 'trace']
+
+
+def node_vars(node, bound):
+    # The variables of a node as created by reo.extendNode
+    return {'time': [TimeVar(node + '_t_' + str(i)) for i in range(bound)],
+            'data': [DataVar(node + '_d_' + str(i)) for i in range(bound)]}
+
+
+def value(model, var):
+    return model.eval(var, model_completion=True)
+
+
+def time_value(val):
+    # Time stamps are rationals or, with the integer time domain, integers counting 1 / TIME_SCALE time units
+    return Fraction(str(val)) / Channel.TIME_SCALE
+
+
+def data_value(val):
+    # Data values are integers or, with the bit-vector data domain, signed bit-vectors
+    return val.as_signed_long() if is_bv_value(val) else val.as_long()
+
+
+def blocking_clause(model, nodes, bound, coverage):
+    """
+    A constraint that excludes every later model equal to `model` in all `coverage` goals on `nodes`
+    """
+    facts = []
+    variables = [node_vars(nd, bound) for nd in nodes]
+    if 'data' in coverage or 'trace' in coverage:
+        facts += [d == value(model, d) for v in variables for d in v['data']]
+    if 'trace' in coverage:
+        facts += [t == value(model, t) for v in variables for t in v['time']]
+    if 'interleaving' in coverage:
+        stamps = [t for v in variables for t in v['time']]
+        for a, b in combinations(stamps, 2):
+            x, y = time_value(value(model, a)), time_value(value(model, b))
+            facts += [a < b if x < y else (a > b if x > y else a == b)]
+    return Not(And(facts))
+
+
+def trace_of(model, nodes, bound):
+    """
+    The behavior of `nodes` in `model`: {node: [{'time': float, 'data': int}, ...]}
+    """
+    trace = {}
+    for nd in nodes:
+        v = node_vars(nd, bound)
+        trace[nd] = [{'time': float(time_value(value(model, v['time'][i]))),
+                      'data': data_value(value(model, v['data'][i]))} for i in range(bound)]
+    return trace
+
+
+def enumerate_models(solver, nodes, bound, coverage, limit=None):
+    """
+    Yield the traces of `nodes` in successive models of `solver`, blocking each one (per `coverage`) on the
+    same solver before looking for the next
+    """
+    count = 0
+    while limit is None or count < limit:
+        if str(solver.check()) != 'sat':
+            return
+        model = solver.model()
+        yield trace_of(model, nodes, bound)
+        solver.add(blocking_clause(model, nodes, bound, coverage))
+        count += 1
+
+
+def traces(connector, bound, coverage=('data',), nodes=None, limit=None):
+    """
+    Yield distinct behaviors of a connector up to `bound` on `nodes` (its source and sink nodes by default)
+    """
+    solver, _ = connector.behaviorSolver(bound)
+    if nodes is None:
+        nodes = ConnectorGraph.of(connector).boundary()
+    yield from enumerate_models(solver, nodes, bound, coverage, limit)
+
+
+def counterexamples(source_conn, target_conn, bound, coverage=('data',), limit=None):
+    """
+    Yield distinct counter-examples of source <= target up to `bound`: behaviors of source on the nodes both
+    connectors share that target does not allow
+    """
+    solver = source_conn.refinementSolver(target_conn, bound)
+    nodes = [nd for nd in ConnectorGraph.of(source_conn).uses if nd in ConnectorGraph.of(target_conn).uses]
+    yield from enumerate_models(solver, nodes, bound, coverage, limit)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate test traces of a connector as JSON lines")
+    parser.add_argument("case_name", help="Test case of test_cases.py (or of --cases)")
+    parser.add_argument("--cases", metavar="CORPUS", help="Take the test case from a JSON-lines corpus (see main.py --cases)")
+    parser.add_argument("--side", choices=["impl", "spec"], default="impl",
+                        help="Connector to generate traces of (with --counterexamples: the refining side)")
+    parser.add_argument("--counterexamples", action="store_true",
+                        help="Generate counter-examples of side <= other side instead of traces")
+    parser.add_argument("--bound", type=int, default=5, help="Length of the traces (default: 5)")
+    parser.add_argument("--count", type=int, default=100, help="Maximal number of traces (default: 100)")
+    parser.add_argument("--coverage", default="data",
+                        help=f"Comma-separated coverage goals that make traces distinct: {', '.join(COVERAGE)} (default: data)")
+    parser.add_argument("--output", help="JSONL file to write (default: standard output)")
+    args = parser.parse_args()
+
+    coverage = args.coverage.split(",")
+    for goal in coverage:
+        if goal not in COVERAGE:
+            parser.error(f"unknown coverage goal '{goal}' (available: {', '.join(COVERAGE)})")
+    try:
+        corpus = open_corpus(args.cases)
+        if args.case_name not in corpus.names():
+            parser.error(f"test case '{args.case_name}' not found")
+    except ValueError as e:
+        parser.error(str(e))
+
+    [(_, (spec_list, impl_list))] = corpus.load([args.case_name])
+    connectors = {"spec": define_connector(spec_list)[0], "impl": define_connector(impl_list)[0]}
+    source = connectors[args.side]
+    if args.counterexamples:
+        target = connectors["spec" if args.side == "impl" else "impl"]
+        generated = counterexamples(source, target, args.bound, coverage, args.count)
+    else:
+        generated = traces(source, args.bound, coverage, limit=args.count)
+
+    out = sys.stdout if args.output is None else open(args.output, 'w')
+    try:
+        for index, trace in enumerate(generated):
+            out.write(json.dumps({'case': args.case_name, 'side': args.side, 'index': index, 'trace': trace}) + "\n")
+            out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+import os
+import sys
+
+import pytest
+import z3
+
+# The modules of the checker import each other from the Models directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from automerger import define_connector
+from reo import getSettings, applySettings
+from runner import DIRECTIONS, run_check
+
+
+@pytest.fixture(autouse=True)
+def settings():
+    # Tests switch the global settings of Channel and Connector; restore them afterwards
+    saved = getSettings()
+    yield
+    applySettings(saved)
+
+
+@pytest.fixture
+def verdicts():
+    """
+    verdicts(spec channels, impl channels, bound) -> the statuses of Impl <= Spec and Spec <= Impl (uncached)
+    """
+    def run(spec_list, impl_list, bound, max_bound=None):
+        connectors = {"Spec": define_connector(spec_list)[0], "Impl": define_connector(impl_list)[0]}
+        return tuple(run_check(connectors[source], connectors[target], bound, max_bound)['status']
+                     for source, target in DIRECTIONS)
+    return run
+
+
+@pytest.fixture
+def unknown(monkeypatch):
+    """
+    Every solver gives up: Solver.check returns unknown
+    """
+    monkeypatch.setattr(z3.Solver, 'check', lambda self, *assumptions: z3.unknown)
@@ -0,0 +1,73 @@
+import pytest
+
+import test_cases
+from automerger import define_connector
+from channel import Channel
+from reo import Connector
+from runner import DIRECTIONS, run_check
+
+# The deterministic test cases with Mergers
+MERGER_CASES = ['test_basic_06', 'test_basic_07', 'test_basic_08', 'test_time_02', 'test_time_03']
+
+# The deterministic test cases
+DETERMINISTIC_CASES = [f'test_basic_0{i}' for i in range(1, 9)] + ['test_time_01', 'test_time_02', 'test_time_03']
+
+# (spec, impl) pairs with data constants, including ones the smallest bit-vector width cannot hold
+DATA_PAIRS = [
+    (['Sync A B'], ['Producerp([5,300]) A B']),
+    (['Filterp([300]) A B'], ['Sync A B']),
+    (['Filterp([300]) A B'], ['Filterp([300]) A C', 'Sync C B']),
+    (['Fifo1 A B'], ['CptSync(1) A B'])
+    ]
+
+# (spec, impl) pairs with timer delays that are not whole time units, so --time int scales them
+TIMER_PAIRS = [
+    (['Timert(0.5) A C'], ['Timert(0.5) A B', 'Sync B C']),
+    (['Timert(1.5) A C'], ['Timert(1) A B', 'Timert(0.5) B C']),
+    (['Timert(0.25) A B'], ['Fifo1 A B']),
+    (['EXPTimert(0.5) A B'], ['RSTTimert(0.5) A B'])
+    ]
+
+
+@pytest.mark.parametrize('name', MERGER_CASES)
+@pytest.mark.parametrize('bound', [2, 3])
+def test_merger_encodings_agree(name, bound, verdicts):
+    spec_list, impl_list = getattr(test_cases, name)
+    Channel.MERGER_ENCODING = 'interleaving'
+    interleaving = verdicts(spec_list, impl_list, bound)
+    Channel.MERGER_ENCODING = 'counter'
+    assert verdicts(spec_list, impl_list, bound) == interleaving
+
+
+@pytest.mark.parametrize('bound', [2, 3])
+def test_merger_encodings_agree_on_probabilities(bound):
+    # test_prob_03 draws at random, so the encodings are compared on its exact probabilities
+    Connector.EXACT = True
+    results = {}
+    for encoding in ['interleaving', 'counter']:
+        Channel.MERGER_ENCODING = encoding
+        connectors = {"Spec": define_connector(test_cases.test_prob_03[0])[0],
+                      "Impl": define_connector(test_cases.test_prob_03[1])[0]}
+        results[encoding] = [run_check(connectors[source], connectors[target], bound)['probability']
+                             for source, target in DIRECTIONS]
+    assert results['counter'] == results['interleaving']
+
+
+@pytest.mark.parametrize('case', DETERMINISTIC_CASES + DATA_PAIRS)
+@pytest.mark.parametrize('bound', [2, 3])
+def test_data_domains_agree(case, bound, verdicts):
+    spec_list, impl_list = getattr(test_cases, case) if isinstance(case, str) else case
+    Channel.DATA_DOMAIN = 'int'
+    integers = verdicts(spec_list, impl_list, bound)
+    Channel.DATA_DOMAIN = 'bv'
+    assert verdicts(spec_list, impl_list, bound) == integers
+
+
+@pytest.mark.parametrize('case', DETERMINISTIC_CASES + TIMER_PAIRS)
+@pytest.mark.parametrize('bound', [2, 3])
+def test_time_domains_agree(case, bound, verdicts):
+    spec_list, impl_list = getattr(test_cases, case) if isinstance(case, str) else case
+    Channel.TIME_DOMAIN = 'real'
+    reals = verdicts(spec_list, impl_list, bound)
+    Channel.TIME_DOMAIN = 'int'
+    assert verdicts(spec_list, impl_list, bound) == reals
@@ -0,0 +1,51 @@
+import pytest
+
+from automerger import define_connector
+from graph import reduce_pair
+from reo import Connector
+from runner import run_check
+from test_cases import test_prob_03
+
+# (spec, impl, channels of the reduced impl, channels of the reduced spec)
+CASES = {
+    # A ring with a token has behaviors and no observable node: it is dropped on either side
+    'ring_in_impl': (['Fifo1 A B'], ['Fifo1 A B', 'Fifo1e(1) X Y', 'Fifo1 Y X'], 1, 1),
+    'ring_in_spec': (['Fifo1 A B', 'Fifo1e(1) X Y', 'Fifo1 Y X'], ['Fifo1 A B'], 1, 1),
+    # An empty ring has no behaviors, so it is kept: it leaves the impl without behaviors
+    'empty_ring': (['Fifo1 A B'], ['Fifo1 A B', 'Fifo1 X Y', 'Fifo1 Y X'], 3, 1),
+    'drained_ring': (['Sync A B'], ['Sync A B', 'Fifo1e(1) X Y', 'Fifo1 Y X', 'SyncDrain X Y'], 4, 1),
+    # A randomized component is kept, its behaviors change with every encoding
+    'randomized': (['Sync A B'], ['Sync A B', 'LossyFIFO1(0.5) X Y'], 2, 1),
+}
+
+
+@pytest.mark.parametrize('name', sorted(CASES))
+@pytest.mark.parametrize('bound', [1, 3])
+def test_cone_of_influence_keeps_verdicts(name, bound):
+    spec_list, impl_list, impl_size, spec_size = CASES[name]
+    spec, impl = define_connector(spec_list)[0], define_connector(impl_list)[0]
+    reduced_impl, reduced_spec = reduce_pair(impl, spec, [bound])
+    assert (len(reduced_impl.channels), len(reduced_spec.channels)) == (impl_size, spec_size)
+
+    if name == 'randomized':
+        return  # Its verdicts are samples
+    for (source, target), (reduced_source, reduced_target) in [((impl, spec), (reduced_impl, reduced_spec)),
+                                                               ((spec, impl), (reduced_spec, reduced_impl))]:
+        assert reduced_source.isRefinementOf(reduced_target, bound)[0] == source.isRefinementOf(target, bound)[0]
+
+
+def test_merger_nodes():
+    # Every Merger is connected over real nodes: its sources are the hidden nodes its feeding channels write to
+    conn = define_connector(test_prob_03[1])[0]
+    mergers = [nodes for chan, nodes in conn.channels if chan == 'Merger']
+    assert mergers == [('F_0', 'G_1', 'B')]
+    writers = {nodes[-1]: chan for chan, nodes in conn.channels if chan != 'Merger'}
+    assert writers['F_0'] == 'Producerp([0])' and writers['G_1'] == 'Producerp([1])'
+
+
+def test_merger_verdicts():
+    # Exact probabilities of test_prob_03; with the Merger over the characters of a node name both were 1
+    Connector.EXACT = True
+    spec, impl = define_connector(test_prob_03[0])[0], define_connector(test_prob_03[1])[0]
+    assert run_check(impl, spec, 3)['probability'] == '0'
+    assert run_check(spec, impl, 3)['probability'] == '1/4'
@@ -0,0 +1,94 @@
+import pytest
+import z3
+
+import test_cases
+from automerger import define_connector
+from channel import Channel, Conjunction, useDomains
+from induction import PROBE, check_inductive, window
+from reo import Connector
+from rewrite import normalize_pair
+from runner import DIRECTIONS, run_check
+
+
+def alternating(nodes, bound):
+    # Not uniform: odd steps increment the data, even steps copy it
+    return Conjunction([nodes[1]['data'][i] == nodes[0]['data'][i] + i % 2 for i in range(bound)] +
+                       [nodes[0]['time'][i] == nodes[1]['time'][i] for i in range(bound)])
+
+
+def late(nodes, bound):
+    # Not uniform past the probed bounds: a Sync that starts incrementing the data at step 12
+    return Conjunction([nodes[1]['data'][i] == nodes[0]['data'][i] + (i >= 12) for i in range(bound)] +
+                       [nodes[0]['time'][i] == nodes[1]['time'][i] for i in range(bound)])
+
+
+@pytest.fixture
+def test_channels(monkeypatch):
+    monkeypatch.setattr(Channel, 'Alternating', staticmethod(alternating), raising=False)
+    monkeypatch.setattr(Channel, 'Late', staticmethod(late), raising=False)
+
+
+def probe(channels):
+    conn = define_connector(channels)[0]
+    useDomains([conn], PROBE + 1)
+    return window(conn)
+
+
+def test_window_of_uniform_channels():
+    assert probe(['Sync A B', 'Fifo1 B C', 'Fifo1e(1) C D', 'SyncDrain A D', 'Timert(1) D E']) == 2
+
+
+@pytest.mark.parametrize('channels', [['Alternating A B'], ['Fifon(2) A B'], ['Sync A B', 'Alternating B C']])
+def test_window_rejects_encodings_that_are_not_uniform(channels, test_channels):
+    # Fifon(2) only constrains the buffer at the last step, so its encoding is not prefix-closed
+    assert probe(channels) is None
+
+
+@pytest.mark.parametrize('channels', [['LossySync A B'], ['Filterp([0]) A B'], ['Merger A B C']])
+def test_window_rejects_spans_that_grow_with_the_bound(channels):
+    # One nested term relates every step of these encodings
+    assert probe(channels) is None
+
+
+@pytest.mark.parametrize('channel', ['Alternating', 'Fifon(2)', 'LossySync', 'Late'])
+def test_induction_rejects_channels_that_are_not_uniform(channel, test_channels):
+    source = define_connector([f'{channel} A B'])[0]
+    target = define_connector(['Sync A B'])[0]
+    result, _, _, reason = check_inductive(source, target, 4)
+    assert result is None and reason == f"{channel} is not encoded step by step"
+
+
+def test_base_case_the_solver_gives_up_on_is_not_proven(monkeypatch):
+    # The inductive step holds, but every solver of the base case returns unknown
+    up_to = Connector.isRefinementUpTo
+
+    def giving_up(self, *args):
+        with monkeypatch.context() as patched:
+            patched.setattr(z3.Solver, 'check', lambda solver, *assumptions: z3.unknown)
+            return up_to(self, *args)
+    monkeypatch.setattr(Connector, 'isRefinementUpTo', giving_up)
+    source = define_connector(['Sync A B', 'Fifo1 B C'])[0]
+    target = define_connector(['Sync A D', 'Fifo1 D C'])[0]
+    result, _, _, reason = check_inductive(*normalize_pair(source, target), 4)
+    assert result is None and reason.startswith("the solver gave up on the base case")
+
+
+def test_probes_do_not_see_late_changes(test_channels):
+    # Why induction only accepts UNIFORM channels: the probed bounds look the same as for a Sync
+    assert probe(['Late A B']) == probe(['Sync A B']) == 2
+
+
+def test_proven_checks_hold_at_large_bound():
+    proven = 0
+    for name in dir(test_cases):
+        if not name.startswith('test_'):
+            continue
+        spec_list, impl_list = getattr(test_cases, name)
+        connectors = {"Spec": define_connector(spec_list)[0], "Impl": define_connector(impl_list)[0]}
+        for source_name, target_name in DIRECTIONS:
+            source, target = connectors[source_name], connectors[target_name]
+            result, _, _, _ = check_inductive(*normalize_pair(source, target), 4)
+            if result:
+                proven += 1
+                assert run_check(source, target, 20)['status'] == 'true', (name, source_name, target_name)
+    assert proven >= 4
@@ -0,0 +1,56 @@
+import itertools
+from fractions import Fraction
+
+import pytest
+from z3 import BoolVal, substitute
+
+from automerger import define_connector
+from reo import Channel, newSolver, quantified
+from runner import prepare_pair
+from test_cases import test_prob_02, test_prob_03
+
+# (name, source channels, target channels, whether the query has a ForAll)
+CASES = [
+    ('rdmsync', ['RdmSync A B'], ['RdmSync A B'], False),
+    ('lossy_fifo', ['LossyFIFO1(0.5) A B'], ['Fifo1 A B'], False),
+    ('prob_lossy', ['ProbLossy(0.5) A B'], ['LossySync A B'], False),
+    ('test_prob_02', test_prob_02[1], test_prob_02[0], True),
+    ('test_prob_03', test_prob_03[0], test_prob_03[1], True),
+]
+
+
+def enumerate_probability(source, target, bound):
+    # Probability of refinement by checking every draw of the choices on its own
+    Channel.PROBABILITY, Channel.CHOICES = 'symbolic', []
+    try:
+        assertions = source.refinementSolver(target, bound).assertions()
+        choices = list(Channel.CHOICES)
+    finally:
+        Channel.PROBABILITY, Channel.CHOICES = 'sample', []
+
+    probability = Fraction(0)
+    for values in itertools.product([True, False], repeat=len(choices)):
+        weight = Fraction(1)
+        for (_, p), value in zip(choices, values):
+            weight *= Fraction(str(p)) if value else 1 - Fraction(str(p))
+        draw = [(choice, BoolVal(value)) for (choice, _), value in zip(choices, values)]
+        solver = newSolver(quantified(source, target))
+        solver.add([substitute(assertion, *draw) if draw else assertion for assertion in assertions])
+        if str(solver.check()) == 'unsat':
+            probability += weight
+    return probability
+
+
+@pytest.mark.parametrize('name, source_list, target_list, hidden', CASES, ids=[case[0] for case in CASES])
+@pytest.mark.parametrize('bound', [2, 3])
+def test_exact_probability_matches_enumeration(name, source_list, target_list, hidden, bound):
+    source, target = prepare_pair(define_connector(source_list)[0], define_connector(target_list)[0], bound)
+    assert quantified(source, target) == hidden
+    probability, choices, _ = source.refinementProbability(target, bound)
+    assert choices > 0
+    assert probability == enumerate_probability(source, target, bound)
+
+
+def test_exact_probability_test_prob_02():
+    source, target = prepare_pair(define_connector(test_prob_02[1])[0], define_connector(test_prob_02[0])[0], 4)
+    assert source.refinementProbability(target, 4)[0] == Fraction(1, 16)
@@ -0,0 +1,34 @@
+import pytest
+
+from automerger import define_connector
+from reo import Connector
+from rewrite import normalize_pair
+
+# (spec, impl, channels of the normalized impl): each case exercises one rewrite of normalize
+CASES = {
+    # collapse_syncs: internal Sync chains around a Fifo1, and a chain that joins two boundary nodes
+    'sync_chain': (['Fifo1 A B'], ['Sync A X', 'Sync X Y', 'Fifo1 Y Z', 'Sync Z B'], 1),
+    'sync_chain_boundary': (['Fifo1 A B'], ['Sync A X', 'Sync X B'], 1),
+    # drop_redundant_drains: a repeated drain, a drain next to a Sync and a drain from a node to itself
+    'redundant_drains': (['SyncDrain A B'], ['SyncDrain A B', 'SyncDrain B A', 'Sync A B', 'SyncDrain A A'], 1),
+    # drop_unobservable: a chain of Fifo1s that ends in a dangling internal node is dropped ...
+    'dangling_fifo_output': (['Sync A B'], ['Sync A B', 'Fifo1 B X', 'Fifo1 X Y'], 1),
+    # ... but a Fifo1 with a dangling input is kept, since it delays its output
+    'dangling_fifo_input': (['Sync A B'], ['Sync A B', 'Fifo1 X A'], 2),
+    # A disconnected part with behaviors is dropped, one without behaviors (a Fifo1 drained at once) is kept
+    'disconnected_with_behaviors': (['Sync A B'], ['Sync A B', 'Fifo1 X Y'], 1),
+    'disconnected_without_behaviors': (['Sync A B'], ['Sync A B', 'Fifo1 X Y', 'SyncDrain X Y'], 3),
+}
+
+
+@pytest.mark.parametrize('name', sorted(CASES))
+def test_rewrite_keeps_verdicts(name, verdicts):
+    spec_list, impl_list, size = CASES[name]
+    impl, spec = normalize_pair(define_connector(impl_list)[0], define_connector(spec_list)[0])
+    assert len(impl.channels) == size
+
+    Connector.REWRITE = True
+    rewritten = verdicts(spec_list, impl_list, 4)
+    Connector.REWRITE = False
+    assert rewritten == verdicts(spec_list, impl_list, 4)
+
@@ -0,0 +1,111 @@
+from fractions import Fraction
+
+import pytest
+from z3 import And, BoolVal, Int, Not, Or, Real, RealVal, Solver
+
+import test_cases
+from automerger import define_connector
+from benchmark import timer_pipeline
+from channel import Channel
+from graph import satisfiable
+
+DELAY = 1
+TIMERS = {'OFFTimert': Channel.OFF, 'RSTTimert': Channel.RESET, 'EXPTimert': Channel.EXPIRE}
+
+
+def node(name, length):
+    return {'time': [Real(f"{name}_t_{i}") for i in range(length)],
+            'data': [Int(f"{name}_d_{i}") for i in range(length)]}
+
+
+def reference(kind, t, nodes, bound):
+    """
+    The per-timer encodings the shared state machine replaced, with the two fixes it made: the source gets an
+    item after the bound (so the last item never indexes past it), and an interrupt compares the arrival of the
+    signal on the source end (not sink item i + 1) with the expiry time
+    """
+    signal = TIMERS[kind]
+    src, snk = nodes
+
+    def timer(i, j):
+        if i >= bound or j >= bound:
+            return BoolVal(True)
+        interrupted = And(src['data'][i + 1] == signal, src['time'][i] + t > src['time'][i + 1])
+        timeout = And(snk['data'][j] == Channel.TIMEOUT, snk['time'][j] == src['time'][i] + t,
+                      Or(src['time'][i] + t <= src['time'][i + 1], i == bound - 1))
+        if kind == 'OFFTimert':
+            return Or(And(interrupted, timer(i + 2, j)), And(timeout, timer(i + 1, j + 1)))
+        if kind == 'RSTTimert':
+            return Or(And(interrupted, timer(i + 1, j)), And(timeout, timer(i + 1, j + 1)))
+        expired = And(interrupted, snk['data'][j] == Channel.TIMEOUT, snk['time'][j] == src['time'][i + 1])
+        return Or(And(expired, timer(i + 1, j + 1)), And(timeout, timer(i + 1, j + 1)))
+
+    return timer(0, 0)
+
+
+def traces(src, snk, bound):
+    # Increasing non-negative time stamps; the item after the bound is ordinary data and comes after every timeout
+    constraints = [src['time'][0] >= 0, snk['time'][0] >= 0]
+    for i in range(1, bound):
+        constraints += [src['time'][i - 1] < src['time'][i], snk['time'][i - 1] < snk['time'][i]]
+    constraints += [src['data'][bound] == 0, src['time'][bound] > src['time'][bound - 1] + DELAY]
+    return constraints
+
+
+@pytest.mark.parametrize('kind', sorted(TIMERS))
+@pytest.mark.parametrize('bound', [1, 2, 3, 4])
+def test_shared_encoding_matches_reference(kind, bound):
+    src, snk = node('A', bound + 1), node('B', bound)
+    shared = getattr(Channel, kind)(DELAY)([src, snk], bound)
+    solver = Solver()
+    solver.add(traces(src, snk, bound))
+    solver.add(Not(shared == reference(kind, DELAY, [src, snk], bound)))
+    assert str(solver.check()) == 'unsat'
+
+
+# Source items (time, data) and the timeouts they give with a delay of 1: an item at 0 is interrupted at 0.5
+SCENARIOS = {
+    ('OFFTimert', Channel.OFF): [Fraction(4)],                   # switched off; the item at 3 arms it again
+    ('RSTTimert', Channel.RESET): [Fraction(3, 2), Fraction(4)],  # the RESET item re-arms it
+    ('EXPTimert', Channel.EXPIRE): [Fraction(1, 2), Fraction(3, 2), Fraction(4)],  # expires now, then re-armed
+}
+
+
+def timer_solver(kind, items):
+    src, snk = node('A', len(items)), node('B', len(items))
+    solver = Solver()
+    solver.add(getattr(Channel, kind)(DELAY)([src, snk], len(items)))
+    solver.add([And(src['time'][i] == RealVal(str(time)), src['data'][i] == data) for i, (time, data) in enumerate(items)])
+    return solver, snk
+
+
+@pytest.mark.parametrize('kind, signal', sorted(SCENARIOS))
+def test_timer_traces(kind, signal):
+    solver, snk = timer_solver(kind, [(0, 1), (Fraction(1, 2), signal), (3, 2)])
+    expected = SCENARIOS[(kind, signal)]
+    assert str(solver.check()) == 'sat'
+    model = solver.model()
+    assert [Fraction(model.eval(snk['time'][v]).as_fraction()) for v in range(len(expected))] == expected
+    assert all(model.eval(snk['data'][v]).as_long() == Channel.TIMEOUT for v in range(len(expected)))
+    # The timeouts are forced
+    solver.add(Not(And([snk['time'][v] == model.eval(snk['time'][v]) for v in range(len(expected))])))
+    assert str(solver.check()) == 'unsat'
+
+
+@pytest.mark.parametrize('kind', sorted(TIMERS))
+def test_armed_timer_refuses_other_items(kind):
+    # An item that is not the timer's signal cannot arrive before the armed timer runs out
+    assert str(timer_solver(kind, [(0, 1), (Fraction(1, 2), 2), (3, 2)])[0].check()) == 'unsat'
+    assert str(timer_solver(kind, [(0, 1), (1, 2), (3, 2)])[0].check()) == 'sat'
+
+
+@pytest.mark.parametrize('channels', [['Timert(1) A B'], ['RSTTimert(1) A B'], ['CptSync(1) A B'],
+                                      *test_cases.test_time_01, *test_cases.test_prob_01])
+def test_connectors_emitting_special_items_have_behaviors(channels):
+    # Node data excludes the reserved range 10..20 but for the special items, which timers must be able to emit
+    assert satisfiable(define_connector(channels)[0], 4)
+
+
+@pytest.mark.parametrize('size', [1, 3])
+def test_timer_pipeline_has_behaviors(size):
+    assert all(satisfiable(connector, 4) for connector in timer_pipeline(size))
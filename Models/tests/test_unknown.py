@@ -0,0 +1,60 @@
+import pytest
+import z3
+
+import test_cases
+from automerger import define_connector
+from cache import ResultCache
+from reo import Connector
+from runner import run_check
+from session import RefinementSession
+
+# A quantifier-free case and one whose specification has nodes of its own
+CASES = ['test_basic_03', 'test_basic_08']
+
+
+def connectors(name):
+    spec_list, impl_list = getattr(test_cases, name)
+    return define_connector(impl_list)[0], define_connector(spec_list)[0]
+
+
+@pytest.mark.parametrize('name', CASES)
+@pytest.mark.parametrize('engine', ['mbqi', 'cegar', 'lazy'])
+def test_engines_report_unknown(name, engine, unknown):
+    Connector.ENGINE = engine
+    impl, spec = connectors(name)
+    assert impl.isRefinementOf(spec, 3)[0] is None
+    assert impl.isRefinementUpTo(spec, 3)[0] is None
+    assert run_check(impl, spec, 3)['status'] == 'unknown'
+    assert run_check(impl, spec, 3, max_bound=3)['status'] == 'unknown'
+
+
+@pytest.mark.parametrize('name', CASES)
+def test_session_reports_unknown(name, unknown):
+    impl, spec = connectors(name)
+    session = RefinementSession(3, [impl, spec])
+    assert session.check(impl, spec)[0] is None
+
+
+def test_deepening_stops_at_the_first_unknown_bound(monkeypatch):
+    # The solver gives up from the second bound on
+    check = z3.Solver.check
+    calls = []
+
+    def give_up(self, *assumptions):
+        calls.append(None)
+        return check(self, *assumptions) if len(calls) == 1 else z3.unknown
+    monkeypatch.setattr(z3.Solver, 'check', give_up)
+    impl, spec = connectors('test_basic_03')
+    assert impl.isRefinementUpTo(spec, 4) == (None, 2, None)
+
+
+@pytest.mark.parametrize('name, exact', [('test_basic_03', False), ('test_basic_08', False), ('test_prob_03', True)])
+def test_unknowns_are_not_cached(name, exact, tmp_path, unknown):
+    Connector.EXACT = exact
+    cache = ResultCache(str(tmp_path / 'cache.sqlite'))
+    impl, spec = connectors(name)
+    assert cache.key(impl, spec, 3) is not None
+    assert run_check(impl, spec, 3, cache=cache)['status'] == 'unknown'
+    if not exact:
+        assert run_check(impl, spec, 3, max_bound=3, cache=cache)['status'] == 'unknown'
+    assert cache.connect().execute('SELECT COUNT(*) FROM results').fetchone()[0] == 0